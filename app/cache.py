@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from app.database import on_commit
+
+class TTLCache:
+    """LRU-кэш с ограниченным временем жизни записи и счетчиками попаданий для stats()."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ключ -> (время истечения, значение)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key):
+        # Значение без учета в hits/misses; просроченная запись удаляется
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def lookup(self, key):
+        value = self.peek(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def invalidate_on_commit(session, invalidate):
+    # Запись удаляется сразу и еще раз после commit, чтобы параллельный запрос не вернул в кэш старые данные
+    invalidate()
+    on_commit(session, invalidate)
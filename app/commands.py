@@ -0,0 +1,100 @@
+import logging
+from typing import Optional, Tuple, Type, Union
+from aiogram import F, Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, Message
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Границы, на которых может заканчиваться префикс callback_data: "select_meeting_12", "pick:iu:5:0"
+PREFIX_SEPARATORS = "_:"
+
+class CommandIndex:
+    """Обработчики кнопок, найденные по ключу за один поиск в словаре, а не перебором фильтров.
+
+    Тексты кнопок клавиатуры и точные значения callback_data ищутся в словарях.
+    Префиксы callback_data заканчиваются разделителем ("_" или ":") и хранятся в словаре
+    префиксов: проверяются только границы слов самой callback_data (она не длиннее 64 байт),
+    от самой длинной к короткой, поэтому "select_meeting_reminder_" выбирается раньше
+    "select_meeting_" независимо от порядка подключения модулей. Фабрики CallbackData
+    регистрируются по своему префиксу, и обработчик получает распакованный callback_data.
+    """
+
+    def __init__(self):
+        self.texts = {}  # текст кнопки -> обработчик
+        self.callbacks = {}  # callback_data -> обработчик
+        self.prefixes = {}  # префикс callback_data -> (обработчик, фабрика CallbackData или None)
+
+    def message(self, *texts: str):
+        def register(callback):
+            handler = HandlerObject(callback=callback)
+            for text in texts:
+                self._add(self.texts, text, handler)
+            return callback
+        return register
+
+    def callback_query(self, *values: str, prefix: Union[str, Tuple[str, ...], Type[CallbackData]] = None):
+        def register(callback):
+            handler = HandlerObject(callback=callback)
+            for value in values:
+                self._add(self.callbacks, value, handler)
+            if isinstance(prefix, type) and issubclass(prefix, CallbackData):
+                self._add(self.prefixes, f"{prefix.__prefix__}{prefix.__separator__}", (handler, prefix))
+            elif prefix:
+                for value in (prefix,) if isinstance(prefix, str) else prefix:
+                    if value[-1] not in PREFIX_SEPARATORS:
+                        raise ValueError(f"Префикс callback_data должен заканчиваться на один из {PREFIX_SEPARATORS!r}: {value!r}")
+                    self._add(self.prefixes, value, (handler, None))
+            return callback
+        return register
+
+    @staticmethod
+    def _add(index: dict, key: str, value):
+        # Два обработчика на один ключ - ошибка регистрации, а не тихая зависимость от порядка
+        if key in index:
+            raise ValueError(f"Ключ {key!r} уже зарегистрирован")
+        index[key] = value
+
+    def resolve_callback(self, data: str) -> Optional[dict]:
+        handler = self.callbacks.get(data)
+        if handler:
+            return {"command": handler}
+        for position in range(len(data) - 1, 0, -1):
+            if data[position - 1] not in PREFIX_SEPARATORS:
+                continue
+            entry = self.prefixes.get(data[:position])
+            if entry:
+                handler, factory = entry
+                if factory is None:
+                    return {"command": handler}
+                try:
+                    return {"command": handler, "callback_data": factory.unpack(data)}
+                except (TypeError, ValueError):
+                    return None
+        return None
+
+    def match_message(self, message: Message):
+        handler = self.texts.get(message.text)
+        return {"command": handler} if handler else False
+
+    def match_callback(self, callback: CallbackQuery):
+        return self.resolve_callback(callback.data) or False
+
+    def router(self) -> Router:
+        # Один обработчик на вид события: нужный обработчик кнопки находит фильтр по индексу
+        router = Router()
+
+        @router.message(F.text, self.match_message)
+        @router.callback_query(F.data, self.match_callback)
+        async def dispatch_command(event: Union[Message, CallbackQuery], command: HandlerObject, **data):
+            data["handler"] = command
+            return await command.call(event, **data)
+
+        return router
+
+commands = CommandIndex()
+
+# Подключается первым: кнопки меню обрабатываются в любом состоянии FSM, остальные сообщения идут дальше по роутерам
+command_router = commands.router()
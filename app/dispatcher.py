@@ -0,0 +1,47 @@
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+from handlers.router.users import user_router
+from handlers.router.meeting import meeting_router
+from handlers.router.reminders import reminder_router
+from handlers.router.note import note_router
+from handlers.router.feedback import guest_router, admin_router
+from handlers.router.unknow import unknow_router
+from handlers.router.search import search_router
+# Кнопки этих модулей регистрируются в app.commands при импорте
+import handlers.router.pickers
+import handlers.people.participants
+import handlers.people.invitation
+import handlers.people.restore
+from app.commands import command_router
+from app.middlewares import DbSessionMiddleware, UserMiddleware, MetricsMiddleware, HandlerNameMiddleware, FsmBatchMiddleware
+from app.storage import PostgresStorage
+
+def build_dispatcher(storage: BaseStorage = None) -> Dispatcher:
+    """Dispatcher со всеми middleware и роутерами бота: его используют run.py и бенчмарки."""
+    # По умолчанию состояния диалогов хранятся в БД (app/storage.py)
+    dp = Dispatcher(storage=storage or PostgresStorage())
+
+    # Метрики обновления: время, запросы к БД и вызовы Bot API по обработчикам; первым, чтобы учесть и commit
+    dp.update.outer_middleware(MetricsMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(HandlerNameMiddleware())
+    # Изменения FSM обновления - одной записью на ключ после обработчика
+    if isinstance(dp.storage, PostgresStorage):
+        dp.update.outer_middleware(FsmBatchMiddleware(dp.storage))
+    # Одна сессия БД на каждое обновление
+    dp.update.outer_middleware(DbSessionMiddleware())
+    # Текущий пользователь из кэша вместо запроса в каждом обработчике
+    dp.update.outer_middleware(UserMiddleware())
+
+    # Подключение маршрутизаторов
+    # Кнопки меню и callback-кнопки: один поиск по индексу app.commands вместо перебора фильтров
+    dp.include_router(command_router)
+    dp.include_router(search_router)
+    dp.include_router(user_router)
+    dp.include_router(meeting_router)
+    dp.include_router(reminder_router)
+    dp.include_router(note_router)
+    dp.include_router(guest_router)
+    dp.include_router(admin_router)
+    dp.include_router(unknow_router)
+    return dp
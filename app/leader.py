@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import asyncpg
+from app.config import LEADER_RETRY_INTERVAL, LEADER_CHECK_INTERVAL
+from app.database import ASYNCPG_DSN
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+async def run_as_leader(name: str, *jobs):
+    """Запускает задачи jobs только в одном экземпляре бота из всех, подключенных к БД.
+
+    Ведущий держит сессионную advisory-блокировку на отдельном соединении. Если процесс
+    или соединение пропадает, PostgreSQL снимает блокировку, и ее захватывает другой
+    экземпляр. При потере соединения или падении задачи задачи останавливаются и выборы
+    повторяются.
+    """
+    while True:
+        connection = None
+        tasks = []
+        leading = False
+        try:
+            connection = await asyncpg.connect(ASYNCPG_DSN)
+            while not await connection.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", name):
+                await asyncio.sleep(LEADER_RETRY_INTERVAL)
+            leading = True
+            logger.info(f"Экземпляр стал ведущим: {name}")
+            tasks = [asyncio.create_task(job()) for job in jobs]
+            while not any(task.done() for task in tasks):
+                await asyncio.sleep(LEADER_CHECK_INTERVAL)
+                # Блокировка жива, пока живо соединение
+                await connection.fetchval("SELECT 1", timeout=LEADER_CHECK_INTERVAL)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception():
+                    logger.error(f"Фоновая задача {name} завершилась с ошибкой: {str(task.exception())}")
+        except Exception as e:
+            logger.error(f"Ошибка ведущего экземпляра {name}: {str(e)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if connection and not connection.is_closed():
+                await connection.close()
+        if leading:
+            logger.warning(f"Экземпляр больше не ведущий: {name}")
+        await asyncio.sleep(LEADER_RETRY_INTERVAL)
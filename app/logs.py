@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from app.config import (
+    LOG_DIR, LOG_LEVEL, LOG_FORMAT, LOG_ROTATE, LOG_MAX_BYTES, LOG_ROTATE_WHEN, LOG_BACKUP_COUNT, LOG_UPDATE_SAMPLE
+)
+
+# Логгер aiogram, который пишет строку на каждое обработанное обновление
+UPDATE_LOGGER = "aiogram.event"
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON: время, уровень, логгер, сообщение и трассировка."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class LocalQueueHandler(QueueHandler):
+    """Очередь внутри процесса: запись не форматируется в цикле событий, это делает поток QueueListener.
+
+    Аргументы сообщения подставляются позже, поэтому в лог нельзя передавать объекты,
+    которые меняются сразу после вызова (в обработчиках сообщения собираются f-строками).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class SampleFilter(logging.Filter):
+    """Пропускает каждую rate-ю запись уровня INFO и ниже от логгера name; предупреждения и ошибки - всегда."""
+
+    def __init__(self, name: str, rate: int):
+        super().__init__()
+        self.logger_name = name
+        self.rate = max(rate, 1)
+        self.seen = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name != self.logger_name or record.levelno > logging.INFO or self.rate == 1:
+            return True
+        self.seen += 1
+        if self.seen % self.rate:
+            self.dropped += 1
+            return False
+        return True
+
+def file_handler(path: str, rotate: str):
+    if rotate == "time":
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+
+def setup_logging(directory: str = LOG_DIR, level: str = LOG_LEVEL, log_format: str = LOG_FORMAT,
+                  rotate: str = LOG_ROTATE, update_sample: int = LOG_UPDATE_SAMPLE, console: bool = True) -> QueueListener:
+    """Подключает к корневому логгеру QueueHandler и запускает QueueListener.
+
+    Цикл событий только кладет запись в очередь; форматирование и запись в файлы
+    logs/info.log, logs/error.log и в консоль выполняет поток QueueListener.
+    Вызывающий останавливает возвращенный listener при завершении, чтобы дописать очередь.
+    """
+    os.makedirs(directory, exist_ok=True)
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Обработчик для информационных сообщений
+    info_handler = file_handler(os.path.join(directory, 'info.log'), rotate)
+    info_handler.setLevel(logging.INFO)
+    # Обработчик для ошибок и критических сообщений
+    error_handler = file_handler(os.path.join(directory, 'error.log'), rotate)
+    error_handler.setLevel(logging.ERROR)
+    handlers = [info_handler, error_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.DEBUG)
+        handlers.append(console_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    # Лишние строки отбрасываются еще до очереди
+    queue_handler.addFilter(SampleFilter(UPDATE_LOGGER, update_sample))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,162 @@
+import time
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+from sqlalchemy import event
+from app.config import METRICS_HOST, METRICS_PORT, METRICS_PATH
+from app.database import engine, async_engine, fsm_engine
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм: время в секундах и число запросов к БД
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Гистограмма в формате Prometheus: число наблюдений по корзинам, сумма и количество."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class HistogramFamily:
+    """Гистограммы одной метрики по значениям метки."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series: Dict[str, Histogram] = {}
+
+    def observe(self, label_value: str, value: float):
+        histogram = self.series.get(label_value)
+        if histogram is None:
+            histogram = self.series[label_value] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, histogram in sorted(self.series.items()):
+            label = f'{self.label}="{escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {histogram.sum:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {histogram.count}")
+        return lines
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+@dataclass
+class UpdateStats:
+    """Затраты одного обновления: какой обработчик его принял, запросы к БД и вызовы Bot API."""
+    handler: str = "unhandled"
+    db_queries: int = 0
+    db_time: float = 0.0
+    api_calls: int = 0
+    api_time: float = 0.0
+
+# Затраты обновления, которое сейчас обрабатывается в этой задаче asyncio
+current_update: ContextVar[Optional[UpdateStats]] = ContextVar("current_update", default=None)
+
+handler_seconds = HistogramFamily("bot_handler_seconds", "Время обработки обновления, включая commit", "handler")
+handler_db_queries = HistogramFamily("bot_handler_db_queries", "Запросов к БД за обновление", "handler", COUNT_BUCKETS)
+handler_db_seconds = HistogramFamily("bot_handler_db_seconds", "Время запросов к БД за обновление", "handler")
+handler_api_seconds = HistogramFamily("bot_handler_api_seconds", "Время вызовов Bot API за обновление", "handler")
+db_query_seconds = HistogramFamily("bot_db_query_seconds", "Время одного запроса к БД", "engine")
+api_request_seconds = HistogramFamily("bot_api_request_seconds", "Время одного вызова Bot API", "method")
+HISTOGRAMS = (handler_seconds, handler_db_queries, handler_db_seconds, handler_api_seconds, db_query_seconds, api_request_seconds)
+
+# Источники текущих значений: имя -> функция, возвращающая словарь чисел (stats() пула, очереди, кэшей)
+collectors: Dict[str, Callable[[], dict]] = {}
+
+def register_collector(name: str, collect: Callable[[], dict]):
+    collectors[name] = collect
+
+def handler_name(handler) -> str:
+    callback = handler.callback
+    return f"{callback.__module__}.{callback.__qualname__}"
+
+def observe_update(stats: UpdateStats, elapsed: float):
+    handler_seconds.observe(stats.handler, elapsed)
+    handler_db_queries.observe(stats.handler, stats.db_queries)
+    handler_db_seconds.observe(stats.handler, stats.db_time)
+    handler_api_seconds.observe(stats.handler, stats.api_time)
+
+def track_queries(sync_engine, label: str):
+    # Время каждого запроса и его учет в затратах текущего обновления
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_seconds.observe(label, elapsed)
+        stats = current_update.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += elapsed
+
+track_queries(async_engine.sync_engine, "async")
+track_queries(fsm_engine.sync_engine, "fsm")
+track_queries(engine, "sync")
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время каждого вызова Bot API по методам (подключается к bot.session)."""
+
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            elapsed = time.perf_counter() - start
+            api_request_seconds.observe(method.__api_method__, elapsed)
+            stats = current_update.get()
+            if stats is not None:
+                stats.api_calls += 1
+                stats.api_time += elapsed
+
+def render() -> str:
+    lines = []
+    for family in HISTOGRAMS:
+        lines += family.render()
+    for name, collect in collectors.items():
+        try:
+            values = collect()
+        except Exception as e:
+            logger.error(f"Ошибка при сборе метрик {name}: {str(e)}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE bot_{name}_{key} gauge")
+                lines.append(f"bot_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+async def run_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    # Отдельный локальный сервер: метрики не попадают на публичный адрес webhook
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}{METRICS_PATH}")
+    return runner
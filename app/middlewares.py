@@ -0,0 +1,127 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from app.database import AsyncSessionLocal
+from app.users import get_user
+from app.metrics import UpdateStats, current_update, handler_name, observe_update
+import logging
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+async def answer_error(event: Update, text: str):
+    # Ответ пользователю в тот же чат, из которого пришло обновление
+    if event.message:
+        await event.message.answer(text)
+    elif event.callback_query and event.callback_query.message:
+        await event.callback_query.message.answer(text)
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия БД на обновление: один commit в конце, rollback при ошибке."""
+
+    def __init__(self, session_pool=AsyncSessionLocal):
+        self.session_pool = session_pool
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Соединение берется из пула только при первом запросе и возвращается при выходе из блока
+        async with self.session_pool() as session:
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+                await session.commit()
+                return result
+            except IntegrityError as e:
+                await session.rollback()
+                logger.error(f"IntegrityError: {str(e)}")
+                await answer_error(event, "Произошла ошибка целостности данных. Попробуйте позже.")
+            except SQLAlchemyError as e:
+                await session.rollback()
+                logger.error(f"SQLAlchemyError: {str(e)}")
+                await answer_error(event, "Произошла ошибка базы данных. Попробуйте позже.")
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Unexpected error: {str(e)}")
+                await answer_error(event, f"Произошла ошибка: {str(e)}")
+
+class FsmBatchMiddleware(BaseMiddleware):
+    """Изменения FSM за обновление пишутся одной командой на ключ после обработчика (PostgresStorage.batch)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.storage.batch():
+            return await handler(event, data)
+
+class FsmFlushMiddleware(BaseRequestMiddleware):
+    """Изменения FSM обновления пишутся до вызова Bot API (подключается к bot.session).
+
+    Иначе пользователь мог бы ответить на сообщение бота раньше, чем batch() запишет новое
+    состояние, и его ответ обработался бы в старом состоянии.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def __call__(self, make_request, bot, method):
+        await self.storage.flush_pending()
+        return await make_request(bot, method)
+
+class UserMiddleware(BaseMiddleware):
+    """Текущий пользователь (UserInfo или None) из кэша в data["user"]; подключается после DbSessionMiddleware."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        data["user"] = await get_user(data["session"], from_user.id) if from_user else None
+        return await handler(event, data)
+
+class MetricsMiddleware(BaseMiddleware):
+    """Время обработки, запросы к БД и вызовы Bot API каждого обновления; подключается первым, до DbSessionMiddleware."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            observe_update(stats, time.perf_counter() - start)
+            current_update.reset(token)
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: отмечает в метриках обновления обработчик, который его принял."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = current_update.get()
+        if stats is not None:
+            # Для кнопок из app.commands - сам обработчик кнопки, а не общий dispatch_command
+            stats.handler = handler_name(data.get("command") or data["handler"])
+        return await handler(event, data)
@@ -0,0 +1,33 @@
+import logging
+from pathlib import Path
+import asyncpg
+from app.database import ASYNCPG_DSN, db_url
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Файлы NNNN_описание.sql применяются по порядку, каждый один раз и в своей транзакции
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+async def apply_migrations():
+    if db_url.get_backend_name() != "postgresql":
+        logger.info("Миграции пропущены: поддерживается только PostgreSQL")
+        return
+    connection = await asyncpg.connect(ASYNCPG_DSN)
+    try:
+        # Несколько экземпляров бота не применяют миграции одновременно
+        await connection.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        await connection.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+        )
+        applied = {row["version"] for row in await connection.fetch("SELECT version FROM schema_migrations")}
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            if path.stem in applied:
+                continue
+            async with connection.transaction():
+                await connection.execute(path.read_text(encoding="utf-8"))
+                await connection.execute("INSERT INTO schema_migrations (version) VALUES ($1)", path.stem)
+            logger.info(f"Применена миграция {path.stem}")
+    finally:
+        await connection.close()
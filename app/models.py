@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -22,6 +22,11 @@ class User(Base):
     invitations = relationship("MeetingInvitation", back_populates="user")
     feedback = relationship("Feedback", back_populates="user")
 
+    # Индексы продублированы в migrations/0002_hot_query_indexes.sql
+    __table_args__ = (
+        Index("ix_Users_role_deleted_flag", "role", "deleted_flag"),
+    )
+
 class Meeting(Base):
     __tablename__ = 'Meetings'
     id = Column(Integer, primary_key=True, index=True)
@@ -36,6 +41,11 @@ class Meeting(Base):
     meeting_notes = relationship("MeetingNote", back_populates="meeting")
     invitations = relationship("MeetingInvitation", back_populates="meeting")
 
+    __table_args__ = (
+        Index("ix_Meetings_scheduled_at_id", "scheduled_at", "id"),
+        Index("ix_Meetings_creator_id", "creator_id"),
+    )
+
 class Reminder(Base):
     __tablename__ = "reminders"
     reminder_id = Column(Integer, primary_key=True, index=True)
@@ -46,6 +56,11 @@ class Reminder(Base):
     meeting = relationship("Meeting", back_populates="reminders")
     user = relationship("User", back_populates="reminders")
 
+    __table_args__ = (
+        Index("ix_reminders_reminder_time", "reminder_time"),
+        Index("ix_reminders_meeting_id", "meeting_id"),
+    )
+
 class MeetingNote(Base):
     __tablename__ = "meeting_notes"
     id = Column(Integer, primary_key=True, index=True)
@@ -57,6 +72,10 @@ class MeetingNote(Base):
     meeting = relationship("Meeting", back_populates="meeting_notes")
     user = relationship("User", back_populates="meeting_notes")
 
+    __table_args__ = (
+        Index("ix_meeting_notes_meeting_id", "meeting_id"),
+    )
+
 class MeetingInvitation(Base):
     __tablename__ = "MeetingInvitations"
     id = Column(Integer, primary_key=True, index=True)
@@ -67,6 +86,13 @@ class MeetingInvitation(Base):
     meeting = relationship("Meeting", back_populates="invitations")
     user = relationship("User", back_populates="invitations")
 
+    __table_args__ = (
+        Index("ix_MeetingInvitations_user_id_accepted", "user_id", "accepted"),
+        Index("ix_MeetingInvitations_meeting_id_accepted", "meeting_id", "accepted"),
+        # Цель ON CONFLICT для массовых приглашений (migrations/0008_invitation_unique.sql)
+        Index("uq_MeetingInvitations_meeting_id_user_id", "meeting_id", "user_id", unique=True),
+    )
+
 class Feedback(Base):
     __tablename__ = 'feedback'
     id = Column(Integer, primary_key=True, index=True)
@@ -75,3 +101,18 @@ class Feedback(Base):
     answered = Column(Integer, default=0)
     
     user = relationship("User", back_populates="feedback")
+
+    __table_args__ = (
+        Index("ix_feedback_unanswered", "id", postgresql_where=answered == 0),
+    )
+
+class FsmRecord(Base):
+    __tablename__ = "fsm_storage"
+    key = Column(String, primary_key=True)
+    state = Column(String)
+    data = Column(JSON, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_fsm_storage_updated_at", "updated_at"),
+    )
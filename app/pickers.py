@@ -0,0 +1,100 @@
+from typing import Callable, Optional
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import PICKER_PAGE_SIZE
+
+# Пометка выбранной строки в клавиатуре с выбором нескольких строк
+SELECTED_MARK = "✅ "
+
+class PickerPage(CallbackData, prefix="pick"):
+    """Кнопка перехода по страницам: имя клавиатуры и id крайней строки текущей страницы."""
+    name: str
+    cursor: int
+    back: int = 0
+
+class Picker:
+    """Клавиатура выбора из строк (id, подпись), которая читает из БД только одну страницу.
+
+    query(user) возвращает select(id, подпись) с нужными фильтрами; страницы листаются
+    keyset-пагинацией по (order, key), поэтому каждая страница - один запрос по индексу.
+    Нажатие на строку отправляет callback_data f"{action}{id}".
+    Для выбора нескольких строк selection - ключ данных FSM со списком выбранных id:
+    такие строки помечаются на каждой странице. Кнопки footer выводятся под списком.
+    allowed(user) - то же условие доступа, что у команды, которая открывает клавиатуру:
+    по нему обработчик страниц отклоняет подделанные кнопки pick:.
+    """
+
+    def __init__(self, name: str, query: Callable, action: str, key, order=None, page_size: int = PICKER_PAGE_SIZE,
+                 selection: str = None, footer: list = None, allowed: Callable = None):
+        self.name = name
+        self.query = query
+        self.action = action
+        self.key = key
+        self.order = order
+        self.page_size = page_size
+        self.selection = selection
+        self.footer = footer or []
+        self.allowed = allowed or (lambda user: True)
+        pickers[name] = self
+
+    def _sort_key(self):
+        return (self.order, self.key) if self.order is not None else (self.key,)
+
+    def _page_query(self, user, cursor: Optional[int], back: bool) -> Select:
+        query = self.query(user)
+        sort_key = self._sort_key()
+        if cursor:
+            # Позиция курсора берется из его строки: в callback_data хранится только id
+            position = select(*sort_key).where(self.key == cursor).correlate(None).scalar_subquery()
+            query = query.filter(tuple_(*sort_key) < position if back else tuple_(*sort_key) > position)
+        order = [column.desc() for column in sort_key] if back else list(sort_key)
+        return query.order_by(None).order_by(*order).limit(self.page_size + 1)
+
+    async def page(self, session: AsyncSession, user, cursor: int = None, back: bool = False, selected=()) -> Optional[InlineKeyboardMarkup]:
+        rows = (await session.execute(self._page_query(user, cursor, back))).all()
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not rows:
+            return None
+        if back:
+            rows.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = bool(cursor), has_more
+
+        keyboard = [
+            [InlineKeyboardButton(text=self._label(row_id, label, row_id in selected), callback_data=f"{self.action}{row_id}")]
+            for row_id, label in rows
+        ]
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton(text="◀", callback_data=PickerPage(name=self.name, cursor=rows[0][0], back=1).pack()))
+        if has_next:
+            navigation.append(InlineKeyboardButton(text="▶", callback_data=PickerPage(name=self.name, cursor=rows[-1][0]).pack()))
+        if navigation:
+            keyboard.append(navigation)
+        keyboard += self.footer
+        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+    def _label(self, row_id: int, label, marked: bool) -> str:
+        text = str(label) if label else f"#{row_id}"
+        return SELECTED_MARK + text if marked else text
+
+    def toggle(self, markup: InlineKeyboardMarkup, row_id: int, marked: bool) -> InlineKeyboardMarkup:
+        # Пометка одной строки на уже показанной странице, без повторного запроса к БД
+        callback_data = f"{self.action}{row_id}"
+        keyboard = []
+        for row in markup.inline_keyboard:
+            buttons = []
+            for button in row:
+                if button.callback_data == callback_data:
+                    text = button.text.removeprefix(SELECTED_MARK)
+                    button = button.model_copy(update={"text": SELECTED_MARK + text if marked else text})
+                buttons.append(button)
+            keyboard.append(buttons)
+        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+# Все клавиатуры выбора по имени: по нему обработчик страниц находит нужную
+pickers = {}
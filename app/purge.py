@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import Column, MetaData, Table, delete, insert, select
+from app.config import PURGE_INTERVAL, PURGE_BATCH_SIZE, PURGE_ARCHIVE
+from app.database import AsyncSessionLocal
+from app.models import Meeting, MeetingInvitation, MeetingNote, Reminder
+from app.scheduler import reminder_scheduler
+from app.views import invalidate_meetings
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Данные совещания удаляются раньше самого совещания из-за внешних ключей
+CHILD_MODELS = (MeetingNote, Reminder, MeetingInvitation)
+
+# Архивные таблицы из migrations/0006_archive_tables.sql; в Base.metadata не входят
+archive_metadata = MetaData()
+ARCHIVE_TABLES = {
+    model.__table__.name: Table(
+        f"{model.__table__.name}_archive", archive_metadata,
+        *[Column(column.name, column.type) for column in model.__table__.columns],
+    )
+    for model in CHILD_MODELS + (Meeting,)
+}
+
+async def purge_batch(session, meeting_ids: list, archive: bool) -> dict:
+    purged = {}
+    for model in CHILD_MODELS + (Meeting,):
+        table = model.__table__
+        condition = table.c.id.in_(meeting_ids) if model is Meeting else table.c.meeting_id.in_(meeting_ids)
+        if archive:
+            await session.execute(insert(ARCHIVE_TABLES[table.name]).from_select(
+                [column.name for column in table.columns], select(table).where(condition)
+            ))
+        result = await session.execute(delete(table).where(condition))
+        purged[table.name] = result.rowcount
+    return purged
+
+async def purge_past_meetings(batch_size: int = PURGE_BATCH_SIZE, archive: bool = PURGE_ARCHIVE) -> dict:
+    """Удаляет прошедшие совещания с их заметками, напоминаниями и приглашениями пачками по batch_size.
+
+    Каждая пачка - отдельная короткая транзакция из нескольких DELETE ... WHERE meeting_id IN (...),
+    поэтому таблицы не блокируются надолго. Возвращает число удаленных строк по таблицам.
+    """
+    now = datetime.now()
+    total = {}
+    while True:
+        async with AsyncSessionLocal() as session:
+            # SKIP LOCKED: совещание, которое сейчас меняет обработчик, дождется следующего запуска
+            meeting_ids = (await session.scalars(
+                select(Meeting.id).where(Meeting.scheduled_at < now).order_by(Meeting.id)
+                .limit(batch_size).with_for_update(skip_locked=True)
+            )).all()
+            if not meeting_ids:
+                break
+            await invalidate_meetings(session, meeting_ids)
+            purged = await purge_batch(session, meeting_ids, archive)
+            await session.commit()
+        for meeting_id in meeting_ids:
+            reminder_scheduler.discard_meeting(meeting_id)
+        for table, rows in purged.items():
+            total[table] = total.get(table, 0) + rows
+        if len(meeting_ids) < batch_size:
+            break
+    return total
+
+async def run_purge(interval: int = PURGE_INTERVAL):
+    while True:
+        try:
+            purged = await purge_past_meetings()
+            if purged:
+                logger.info(f"Удалены прошедшие совещания{' (с архивацией)' if PURGE_ARCHIVE else ''}: {purged}")
+        except Exception as e:
+            logger.error(f"Ошибка при удалении прошедших совещаний: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import asyncpg
+from aiogram import Bot
+from sqlalchemy import update
+import app.keyboards as kb
+from app.config import ROLE_SWEEP_INTERVAL
+from app.database import AsyncSessionLocal, ASYNCPG_DSN
+from app.models import User
+from app.sender import send_queue
+from app.users import user_cache, on_user_changed, USER_CHANNEL
+from app.views import meeting_views, on_views_changed, VIEW_CHANNEL
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Канал, в который пишет триггер users_role_changed (migrations/0001_user_role_notify.sql)
+ROLE_CHANNEL = "user_role_changed"
+# Пауза перед повторным подключением слушателя после обрыва соединения
+RECONNECT_DELAY = 5
+
+async def notify_role_changes(bot: Bot, user_id: int = None) -> int:
+    # Флаг сбрасывается одним UPDATE ... RETURNING: каждое изменение забирает ровно один экземпляр бота
+    stmt = update(User).where(User.role_changed == 1).values(role_changed=0).returning(User.telegram_id, User.role)
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    async with AsyncSessionLocal() as session:
+        users = (await session.execute(stmt)).all()
+        await session.commit()
+
+    for telegram_id, role in users:
+        try:
+            if role == 'admin':
+                await send_queue.send_message(bot, telegram_id, "Ваша роль обновлена на начальника", reply_markup=kb.admin_keyboard())
+            else:
+                await send_queue.send_message(bot, telegram_id, "Ваша роль обновлена на сотрудника", reply_markup=kb.guest_keyboard())
+        except Exception as e:
+            logger.error(f"Ошибка при уведомлении о смене роли {telegram_id}: {str(e)}")
+    return len(users)
+
+async def listen_role_changes(bot: Bot):
+    # Отдельное соединение asyncpg с LISTEN: без запросов к БД, пока роли не меняются.
+    # На том же соединении каждый экземпляр получает изменения пользователей и страниц совещаний и сбрасывает свои кэши
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(ASYNCPG_DSN)
+            events = asyncio.Queue()
+            connection.add_termination_listener(lambda conn: events.put_nowait(None))
+            await connection.add_listener(ROLE_CHANNEL, lambda conn, pid, channel, payload: events.put_nowait(int(payload)))
+            await connection.add_listener(USER_CHANNEL, on_user_changed)
+            await connection.add_listener(VIEW_CHANNEL, on_views_changed)
+            # Изменения (роли, пользователи, страницы совещаний), пришедшие, пока слушателя не было
+            user_cache.clear()
+            meeting_views.clear()
+            await notify_role_changes(bot)
+            while (user_id := await events.get()) is not None:
+                await notify_role_changes(bot, user_id)
+            logger.warning("Соединение слушателя ролей закрыто, переподключение")
+        except Exception as e:
+            logger.error(f"Ошибка при ожидании смены ролей: {str(e)}")
+        finally:
+            if connection and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(RECONNECT_DELAY)
+
+async def reconcile_role_changes(bot: Bot):
+    # Редкая сверка на случай потерянных NOTIFY
+    while True:
+        await asyncio.sleep(ROLE_SWEEP_INTERVAL)
+        try:
+            count = await notify_role_changes(bot)
+            if count:
+                logger.info(f"Сверка ролей: отправлено уведомлений {count}")
+        except Exception as e:
+            logger.error(f"Ошибка при проверке ролей пользователей: {str(e)}")
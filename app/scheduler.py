@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+import logging
+import asyncpg
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, delete
+from app.config import REMINDER_CONCURRENCY, REMINDER_BATCH_SIZE, REMINDER_MAX_ATTEMPTS
+from app.database import AsyncSessionLocal, ASYNCPG_DSN
+from app.models import Reminder, User, Meeting
+from app.sender import send_queue, PRIORITY_REMINDER
+from app.views import invalidate_meetings
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Даже без новых напоминаний планировщик просыпается не реже этого интервала (защита от перевода часов)
+MAX_SLEEP = 300
+# Через сколько секунд повторить напоминание, которое не удалось отправить из-за временной ошибки
+RETRY_DELAY = 60
+# Ошибки, после которых повтор бесполезен: бот заблокирован, чат не найден, сообщение отклонено
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest)
+# Канал, в который пишет триггер reminders_changed (migrations/0005_reminder_notify.sql)
+REMINDER_CHANNEL = "reminder_changed"
+
+class ReminderScheduler:
+    """Очередь напоминаний в памяти: min-heap по reminder_time, сон ровно до ближайшего.
+
+    Работает только в ведущем экземпляре бота (app.leader); в остальных add() ничего не делает.
+    """
+
+    def __init__(self):
+        self._heap = []  # (reminder_time, reminder_id)
+        self._entries = {}  # reminder_id -> (reminder_time, meeting_id)
+        self._attempts = {}  # reminder_id -> сколько раз не удалось отправить
+        self._wakeup = asyncio.Event()
+        self.running = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, reminder_id: int, meeting_id: int, reminder_time: datetime):
+        if not self.running:
+            return
+        self._entries[reminder_id] = (reminder_time, meeting_id)
+        heapq.heappush(self._heap, (reminder_time, reminder_id))
+        # Новое напоминание может оказаться раньше текущего ближайшего
+        if self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+
+    def discard(self, reminder_id: int):
+        # Запись в куче остается и будет пропущена при извлечении
+        self._entries.pop(reminder_id, None)
+        self._attempts.pop(reminder_id, None)
+
+    def discard_meeting(self, meeting_id: int):
+        for reminder_id in [r for r, (_, m) in self._entries.items() if m == meeting_id]:
+            self.discard(reminder_id)
+        # Перестраиваем кучу, если в ней накопилось много удаленных записей
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(t, r) for r, (t, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def clear(self):
+        self._heap = []
+        self._entries = {}
+        self._attempts = {}
+
+    def _on_notify(self, connection, pid, channel, payload):
+        # Напоминание, созданное или перенесенное в любом экземпляре бота
+        reminder_id, meeting_id, reminder_time = payload.split(",")
+        self.add(int(reminder_id), int(meeting_id), datetime.fromisoformat(reminder_time))
+
+    def next_time(self):
+        while self._heap:
+            reminder_time, reminder_id = self._heap[0]
+            entry = self._entries.get(reminder_id)
+            if entry and entry[0] == reminder_time:
+                return reminder_time
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> list:
+        due = []
+        while (reminder_time := self.next_time()) is not None and reminder_time <= now:
+            _, reminder_id = heapq.heappop(self._heap)
+            self._entries.pop(reminder_id, None)
+            due.append(reminder_id)
+        return due
+
+    async def load(self):
+        # Единственное чтение всей таблицы - при запуске
+        async with AsyncSessionLocal() as session:
+            rows = await session.execute(select(Reminder.reminder_id, Reminder.meeting_id, Reminder.reminder_time))
+            for reminder_id, meeting_id, reminder_time in rows:
+                self.add(reminder_id, meeting_id, reminder_time)
+        logger.info(f"Загружено напоминаний: {len(self)}")
+
+    async def run(self, bot: Bot):
+        connection = await asyncpg.connect(ASYNCPG_DSN)
+        lost = asyncio.Event()
+        def on_lost(conn):
+            lost.set()
+            self._wakeup.set()
+
+        connection.add_termination_listener(on_lost)
+        try:
+            # Сначала подписка, затем загрузка: напоминание, созданное между ними, не потеряется
+            await connection.add_listener(REMINDER_CHANNEL, self._on_notify)
+            self.running = True
+            await self.load()
+            await self._loop(bot, lost)
+        finally:
+            self.running = False
+            self.clear()
+            if not connection.is_closed():
+                await connection.close()
+
+    async def _loop(self, bot: Bot, lost: asyncio.Event):
+        while not lost.is_set():
+            self._wakeup.clear()
+            next_time = self.next_time()
+            delay = MAX_SLEEP if next_time is None else min((next_time - datetime.now()).total_seconds(), MAX_SLEEP)
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            due = self.pop_due(datetime.now())
+            if due:
+                try:
+                    await self.deliver(bot, due)
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке напоминаний: {str(e)}")
+        raise ConnectionError("Соединение для уведомлений о напоминаниях закрыто")
+
+    async def deliver(self, bot: Bot, reminder_ids: list):
+        for i in range(0, len(reminder_ids), REMINDER_BATCH_SIZE):
+            batch = reminder_ids[i:i + REMINDER_BATCH_SIZE]
+            # Последняя попытка: при неудаче напоминание удаляется вместе с доставленными
+            last = {r for r in batch if self._attempts.get(r, 0) + 1 >= REMINDER_MAX_ATTEMPTS}
+            failed = await deliver_reminders(bot, batch, last)
+            retrying = {reminder_id for reminder_id, _ in failed}
+            for reminder_id in batch:
+                if reminder_id not in retrying:
+                    self._attempts.pop(reminder_id, None)
+            # Напоминания с временной ошибкой остаются в БД и повторяются позже
+            retry_time = datetime.now() + timedelta(seconds=RETRY_DELAY)
+            for reminder_id, meeting_id in failed:
+                self._attempts[reminder_id] = self._attempts.get(reminder_id, 0) + 1
+                self.add(reminder_id, meeting_id, retry_time)
+
+async def deliver_reminders(bot: Bot, reminder_ids: list, last_attempt: set = frozenset(), concurrency: int = REMINDER_CONCURRENCY) -> list:
+    """Отправляет пачку напоминаний и удаляет завершенные; возвращает [(reminder_id, meeting_id)] для повтора.
+
+    Удаляются доставленные напоминания, напоминания с постоянной ошибкой (PERMANENT_ERRORS),
+    напоминания без сотрудника или совещания и неудачные попытки из last_attempt.
+    """
+    # Один запрос на всю пачку вместо отдельных запросов User и Meeting на каждое напоминание;
+    # outer join: напоминание, у которого нет сотрудника или совещания, тоже находится и удаляется
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(Reminder.reminder_id, Reminder.meeting_id, User.telegram_id, Meeting.title)
+            .outerjoin(User, User.id == Reminder.user_id)
+            .outerjoin(Meeting, Meeting.id == Reminder.meeting_id)
+            .filter(Reminder.reminder_id.in_(reminder_ids))
+        )).all()
+
+    # Соединение уже вернулось в пул: на время отправки сообщений оно не нужно
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(row):
+        # True - доставлено или повтор бесполезен, False - временная ошибка
+        if row.telegram_id is None or row.title is None:
+            logger.warning(f"Напоминание {row.reminder_id} без сотрудника или совещания удалено")
+            return True
+        async with semaphore:
+            try:
+                await send_queue.send_message(bot, row.telegram_id, f"Напоминание:\nСовещание '{row.title}' начнется через несколько минут.", priority=PRIORITY_REMINDER)
+                return True
+            except PERMANENT_ERRORS as e:
+                logger.warning(f"Напоминание {row.reminder_id} не может быть доставлено и удалено: {str(e)}")
+                return True
+            except Exception as e:
+                if row.reminder_id in last_attempt:
+                    logger.error(f"Напоминание {row.reminder_id} удалено после {REMINDER_MAX_ATTEMPTS} попыток: {str(e)}")
+                    return True
+                logger.error(f"Ошибка при отправке напоминания {row.reminder_id}: {str(e)}")
+                return False
+
+    results = await asyncio.gather(*(send(row) for row in rows))
+    done = [row for row, ok in zip(rows, results) if ok]
+    failed = [(row.reminder_id, row.meeting_id) for row, ok in zip(rows, results) if not ok]
+
+    # Все завершенные удаляются одним запросом и одним commit
+    if done:
+        async with AsyncSessionLocal() as session:
+            await invalidate_meetings(session, {row.meeting_id for row in done})
+            await session.execute(delete(Reminder).where(Reminder.reminder_id.in_([row.reminder_id for row in done])))
+            await session.commit()
+    return failed
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,170 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from app.config import SEND_RATE, SEND_CHAT_INTERVAL, SEND_MAX_RETRIES
+from app.database import on_commit
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений: меньше - раньше
+PRIORITY_REMINDER = 0
+PRIORITY_NOTICE = 1
+PRIORITY_BROADCAST = 2
+
+class TokenBucket:
+    """Не больше rate сообщений в секунду с запасом на короткий всплеск."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+@dataclass
+class OutgoingMessage:
+    bot: Bot
+    chat_id: int
+    text: str
+    kwargs: dict
+    future: asyncio.Future
+    # Контекст отправителя: вызов Bot API учитывается в затратах обновления, из которого отправлено сообщение
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+    enqueued: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+class SendQueue:
+    """Общая очередь исходящих сообщений с ограничением скорости Telegram."""
+
+    def __init__(self, rate: float = SEND_RATE, chat_interval: float = SEND_CHAT_INTERVAL, max_retries: int = SEND_MAX_RETRIES):
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._queue = None
+        self._worker = None
+        self._counter = itertools.count()
+        self._chat_ready = {}  # chat_id -> время, раньше которого в чат писать нельзя
+        self._delayed = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.PriorityQueue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+    async def send_message(self, bot: Bot, chat_id: int, text: str, priority: int = PRIORITY_NOTICE, **kwargs):
+        # Ставит сообщение в очередь и ждет фактической отправки; возвращает Message или пробрасывает ошибку.
+        # Ждать доставки могут только фоновые задачи: обработчик обновления держал бы открытую транзакцию
+        return await self._enqueue(bot, chat_id, text, priority, kwargs)
+
+    def enqueue(self, bot: Bot, chat_id: int, text: str, priority: int = PRIORITY_NOTICE, **kwargs) -> asyncio.Future:
+        # Ставит сообщение в очередь и сразу возвращается; ошибка доставки только пишется в лог
+        future = self._enqueue(bot, chat_id, text, priority, kwargs)
+        future.add_done_callback(lambda done: self._log_failure(chat_id, done))
+        return future
+
+    def _enqueue(self, bot: Bot, chat_id: int, text: str, priority: int, kwargs: dict) -> asyncio.Future:
+        self.start()
+        item = OutgoingMessage(bot, chat_id, text, kwargs, asyncio.get_running_loop().create_future())
+        self._put(priority, item)
+        return item.future
+
+    @staticmethod
+    def _log_failure(chat_id: int, future: asyncio.Future):
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Не удалось отправить сообщение в чат {chat_id}: {str(future.exception())}")
+
+    def _put(self, priority: int, item: OutgoingMessage):
+        self._queue.put_nowait((priority, next(self._counter), item))
+
+    def _put_later(self, delay: float, priority: int, item: OutgoingMessage):
+        # Сообщение в занятый чат откладывается, не задерживая остальные чаты
+        self._delayed += 1
+
+        def put():
+            self._delayed -= 1
+            self._put(priority, item)
+
+        asyncio.get_running_loop().call_later(delay, put)
+
+    async def _run(self):
+        while True:
+            priority, _, item = await self._queue.get()
+            wait = self._chat_ready.get(item.chat_id, 0) - time.monotonic()
+            if wait > 0:
+                self._put_later(wait, priority, item)
+                continue
+            await self.bucket.acquire()
+            self._chat_ready[item.chat_id] = time.monotonic() + self.chat_interval
+            if len(self._chat_ready) > 10000:
+                now = time.monotonic()
+                self._chat_ready = {chat: ready for chat, ready in self._chat_ready.items() if ready > now}
+            asyncio.create_task(self._deliver(priority, item), context=item.context)
+
+    async def _deliver(self, priority: int, item: OutgoingMessage):
+        item.attempts += 1
+        try:
+            result = await item.bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except TelegramRetryAfter as e:
+            if item.attempts <= self.max_retries:
+                # Telegram сам сообщает, сколько ждать: повторяем не раньше этого срока
+                self.retries += 1
+                logger.warning(f"Flood control для чата {item.chat_id}, повтор через {e.retry_after} с")
+                self._chat_ready[item.chat_id] = time.monotonic() + e.retry_after
+                self._put_later(e.retry_after, priority, item)
+                return
+            self._fail(item, e)
+        except Exception as e:
+            self._fail(item, e)
+        else:
+            latency = time.monotonic() - item.enqueued
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _fail(self, item: OutgoingMessage, error: Exception):
+        self.failed += 1
+        if not item.future.done():
+            item.future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": (self._queue.qsize() if self._queue else 0) + self._delayed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_avg": round(self.latency_total / self.sent, 6) if self.sent else 0.0,
+            "latency_max": round(self.latency_max, 6),
+        }
+
+send_queue = SendQueue()
+
+def send_after_commit(session, bot: Bot, chat_id: int, text: str, priority: int = PRIORITY_NOTICE, **kwargs):
+    # Сообщение из обработчика обновления: попадает в очередь после commit и не отправляется при откате
+    on_commit(session, lambda: send_queue.enqueue(bot, chat_id, text, priority, **kwargs))
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import Text, and_, case, cast, delete, func, not_, null, or_, select, true, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from app.config import FSM_CACHE_SIZE, FSM_CACHE_TTL, FSM_STATE_TTL, FSM_SWEEP_INTERVAL
+from app.database import FsmSessionLocal, ASYNCPG_DSN
+from app.models import FsmRecord
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Канал, в котором экземпляры бота сообщают об изменении ключа FSM: "<экземпляр> <ключ>"
+FSM_CHANNEL = "fsm_storage_changed"
+# Пауза перед повторным подключением слушателя после обрыва соединения
+RECONNECT_DELAY = 5
+
+# Поля ключа FSM и условие "поле пустое" для строки fsm_storage
+FIELDS = ("state", "data")
+EMPTY = {"state": FsmRecord.state.is_(None), "data": cast(FsmRecord.data, Text) == "{}"}
+RESET = {"state": null(), "data": func.json_build_object()}
+
+@dataclass
+class FsmChange:
+    """Ключ FSM внутри PostgresStorage.batch(): значения до обновления, текущие и записанные поля."""
+    state: Optional[str]
+    data: Dict[str, Any]
+    original: tuple
+    written: set = field(default_factory=set)
+
+# Изменения FSM текущего обновления: ключ -> FsmChange
+pending_changes: ContextVar[Optional[dict]] = ContextVar("fsm_pending_changes", default=None)
+
+class PostgresStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_storage с локальным кэшем чтения.
+
+    Изменения одного обновления копятся в batch() (FsmBatchMiddleware) и пишутся в БД
+    одной командой на ключ, когда обработчик закончил или перед вызовом Bot API
+    (FsmFlushMiddleware); вне batch() - сразу. Неизменившиеся
+    значения не пишутся. Запись меняет только свои поля: состояние или данные, поэтому
+    не затирает то, что другой процесс успел записать во второе поле. Та же команда
+    отправляет NOTIFY, и остальные экземпляры бота сбрасывают этот ключ в своем кэше (listen()). Кэш
+    используется только пока слушатель подключен; без него каждое чтение идет в БД.
+    Диалог, не менявшийся дольше state_ttl секунд, считается пустым и удаляется sweep().
+    Соединения берутся из отдельного пула FsmSessionLocal, а не из пула обработчиков.
+    """
+
+    def __init__(
+        self,
+        session_pool=FsmSessionLocal,
+        key_builder: KeyBuilder = None,
+        cache_size: int = FSM_CACHE_SIZE,
+        cache_ttl: float = FSM_CACHE_TTL,
+        state_ttl: int = FSM_STATE_TTL,
+    ):
+        self.session_pool = session_pool
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.state_ttl = state_ttl
+        self.instance = uuid.uuid4().hex
+        self._cache = OrderedDict()  # key -> (время истечения, state, data)
+        self._listening = False
+        self._changes = 0  # сколько изменений других экземпляров получено
+        self.reads = 0
+        self.cache_hits = 0
+        self.writes = 0
+        self.skipped = 0
+        self.invalidations = 0
+        self.expired = 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._set(self.key_builder.build(key), "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._set(self.key_builder.build(key), "data", data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    @asynccontextmanager
+    async def batch(self):
+        # Изменения внутри блока копятся по ключам и пишутся при выходе: одна запись на ключ вместо одной на вызов
+        changes = {}
+        token = pending_changes.set(changes)
+        try:
+            yield
+        finally:
+            pending_changes.reset(token)
+            await self._flush(changes)
+
+    async def flush_pending(self):
+        # Записать изменения batch() до конца обновления (FsmFlushMiddleware - перед ответом пользователю).
+        # Следующий вызов set_* в том же обновлении снова берет значения из кэша или БД
+        changes = pending_changes.get()
+        if changes:
+            await self._flush(changes)
+            changes.clear()
+
+    async def _get(self, key: str):
+        pending = pending_changes.get()
+        if pending and key in pending:
+            # Изменение этого обновления, еще не записанное в БД
+            change = pending[key]
+            return change.state, change.data
+        self.reads += 1
+        entry = self._cache.get(key) if self._listening else None
+        if entry and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return entry[1], entry[2]
+        changes = self._changes
+        async with self.session_pool() as session:
+            record = await session.get(FsmRecord, key)
+        if record and record.updated_at < datetime.utcnow() - timedelta(seconds=self.state_ttl):
+            # Брошенный диалог: строку удалит ближайшая очистка
+            record = None
+        state, data = (record.state, record.data) if record else (None, {})
+        # Если во время чтения пришло чужое изменение, прочитанное могло устареть: в кэш не кладем
+        if changes == self._changes:
+            self._remember(key, state, data)
+        return state, data
+
+    async def _set(self, key: str, name: str, value):
+        changes = pending_changes.get()
+        batched = changes is not None
+        if not batched:
+            changes = {}
+        change = changes.get(key)
+        if change is None:
+            state, data = await self._get(key)
+            change = changes[key] = FsmChange(state, data, (state, data))
+        setattr(change, name, value)
+        change.written.add(name)
+        if not batched:
+            await self._flush(changes)
+
+    async def _flush(self, changes: dict):
+        for key, change in changes.items():
+            # Записываются только поля, которые действительно изменились; без изменений запроса нет
+            values = {name: getattr(change, name) for name in change.written
+                      if getattr(change, name) != change.original[FIELDS.index(name)]}
+            if values:
+                await self._write(key, values)
+            else:
+                self.skipped += 1
+
+    async def _write(self, key: str, values: dict):
+        # Одна команда: запись, удаление пустой строки и NOTIFY остальным экземплярам. Меняются только поля
+        # из values; остальные остаются такими, какими они записаны в БД, даже если их изменил другой процесс
+        now = datetime.utcnow()
+        # Строка брошенного диалога считается пустой (как в _get): незаписанные поля не возвращаются к жизни
+        expired = FsmRecord.updated_at < now - timedelta(seconds=self.state_ttl)
+        if values.get("state") is not None or values.get("data"):
+            # Строка после записи точно не пустая
+            upsert = insert(FsmRecord).values(key=key, state=values.get("state"), data=values.get("data", {}), updated_at=now)
+            kept = {name: case((expired, RESET[name]), else_=getattr(FsmRecord, name)) for name in FIELDS if name not in values}
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[FsmRecord.key],
+                set_={**{name: upsert.excluded[name] for name in values}, **kept, "updated_at": upsert.excluded.updated_at},
+            ).returning(FsmRecord.state, FsmRecord.data).cte("upsert")
+            result = select(upsert.c.state, upsert.c.data).subquery()
+        else:
+            # Записываются пустые значения: строка удаляется, если и остальные поля пусты, иначе обновляется
+            unwritten = [EMPTY[name] for name in FIELDS if name not in values]
+            empty = or_(expired, and_(*unwritten)) if unwritten else true()
+            removed = delete(FsmRecord).where(FsmRecord.key == key, empty).returning(FsmRecord.key).cte("removed")
+            updated = (
+                update(FsmRecord).where(FsmRecord.key == key, not_(empty)).values(**values, updated_at=now)
+                .returning(FsmRecord.state, FsmRecord.data).cte("updated")
+            )
+            result = union_all(
+                select(updated.c.state, updated.c.data),
+                select(null(), null()).select_from(removed),
+            ).subquery()
+        stmt = select(result.c.state, result.c.data, func.pg_notify(FSM_CHANNEL, f"{self.instance} {key}"))
+        async with self.session_pool() as session:
+            row = (await session.execute(stmt)).first()
+            await session.commit()
+        self.writes += 1
+        self._remember(key, row.state if row else None, (row.data if row else None) or {})
+
+    def _remember(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        if not self._listening:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _on_change(self, connection, pid, channel, payload):
+        instance, key = payload.split(" ", 1)
+        if instance != self.instance:
+            self._changes += 1
+            if self._cache.pop(key, None):
+                self.invalidations += 1
+
+    async def listen(self):
+        # Отдельное соединение asyncpg с LISTEN на все время работы; при обрыве кэш отключается до переподключения
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(ASYNCPG_DSN)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda conn: closed.set())
+                await connection.add_listener(FSM_CHANNEL, self._on_change)
+                # Изменения, сделанные, пока слушателя не было, могли не попасть в кэш
+                self._cache.clear()
+                self._listening = True
+                await closed.wait()
+                logger.warning("Соединение слушателя FSM закрыто, переподключение")
+            except Exception as e:
+                logger.error(f"Ошибка при ожидании изменений FSM: {str(e)}")
+            finally:
+                self._listening = False
+                self._cache.clear()
+                if connection and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def sweep(self) -> int:
+        # Локальный кэш: записи с истекшим сроком
+        now = time.monotonic()
+        for key in [key for key, entry in self._cache.items() if entry[0] <= now]:
+            del self._cache[key]
+        # БД: диалоги без изменений дольше state_ttl
+        cutoff = datetime.utcnow() - timedelta(seconds=self.state_ttl)
+        async with self.session_pool() as session:
+            result = await session.execute(delete(FsmRecord).where(FsmRecord.updated_at < cutoff))
+            await session.commit()
+        self.expired += result.rowcount
+        return result.rowcount
+
+    async def gauge(self) -> dict:
+        # Сколько контекстов хранится в БД и сколько они занимают
+        async with self.session_pool() as session:
+            contexts, size = (await session.execute(
+                select(func.count(), func.coalesce(func.sum(func.pg_column_size(FsmRecord.key) + func.pg_column_size(FsmRecord.data)), 0))
+            )).one()
+        return {"contexts": contexts, "bytes": int(size), **self.stats()}
+
+    async def run_sweeper(self, interval: int = FSM_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = await self.sweep()
+                logger.info(f"Очистка FSM: удалено {expired}, состояние {await self.gauge()}")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке состояний FSM: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            # Приблизительный объем кэша: ключ, состояние и данные в виде JSON
+            "cache_bytes": sum(len(key) + len(state or "") + len(json.dumps(data, default=str)) for key, (_, state, data) in self._cache.items()),
+            "listening": int(self._listening),
+            "reads": self.reads,
+            "cache_hits": self.cache_hits,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "invalidations": self.invalidations,
+            "expired": self.expired,
+        }
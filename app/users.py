@@ -0,0 +1,63 @@
+import logging
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from app.cache import TTLCache, invalidate_on_commit
+from app.models import User
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class UserInfo:
+    """Снимок строки Users: не привязан к сессии и безопасно переживает ее закрытие."""
+    id: int
+    telegram_id: int
+    username: str
+    first_name: str
+    role: str
+    deleted_flag: int
+    is_meeting_creator: int
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserInfo":
+        return cls(user.id, user.telegram_id, user.username, user.first_name, user.role, user.deleted_flag, user.is_meeting_creator)
+
+class UserCache(TTLCache):
+    """LRU-кэш пользователей по telegram_id с ограниченным временем жизни записи."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        super().__init__(maxsize, ttl)
+
+    def get(self, telegram_id: int):
+        return self.lookup(telegram_id)
+
+    def put(self, user: UserInfo):
+        self.store(user.telegram_id, user)
+
+    def invalidate(self, telegram_id: int):
+        self._discard(telegram_id)
+
+user_cache = UserCache()
+
+# Канал, в который пишет триггер users_changed (migrations/0009_user_changed_notify.sql)
+USER_CHANNEL = "user_changed"
+
+def on_user_changed(connection, pid, channel, payload):
+    # Строка изменена в любом экземпляре бота: кэшированная запись устарела
+    user_cache.invalidate(int(payload))
+
+async def get_user(session: AsyncSession, telegram_id: int):
+    # Пользователь из кэша, а при промахе - из БД; незарегистрированные пользователи не кэшируются
+    user = user_cache.get(telegram_id)
+    if user is None:
+        model = await session.scalar(select(User).filter(User.telegram_id == telegram_id))
+        if model is None:
+            return None
+        user = UserInfo.from_model(model)
+        user_cache.put(user)
+    return user
+
+def invalidate_user(session: AsyncSession, telegram_id: int):
+    invalidate_on_commit(session, lambda: user_cache.invalidate(telegram_id))
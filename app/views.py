@@ -0,0 +1,128 @@
+import logging
+from itertools import chain
+from sqlalchemy import Text, case, cast, event, func, literal, null, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import MEETING_VIEW_CACHE_SIZE, MEETING_VIEW_CACHE_TTL
+from app.cache import TTLCache, invalidate_on_commit
+from app.models import Meeting, MeetingNote, Reminder, MeetingInvitation
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+# Канал, в котором экземпляры бота сообщают о сброшенных страницах: scope через пробел или CLEAR_ALL
+VIEW_CHANNEL = "meeting_views_changed"
+CLEAR_ALL = "*"
+# Полезная нагрузка NOTIFY ограничена 8000 байт; если scope больше, другие экземпляры сбрасывают все страницы
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+# Администраторы видят все совещания и делят одни страницы, сотрудник - только совещания, приглашение на которые принял
+ADMIN_SCOPE = "admin"
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def view_scope(user) -> str:
+    return ADMIN_SCOPE if user.role == "admin" else user_scope(user.id)
+
+class MeetingViewCache(TTLCache):
+    """LRU-кэш готовых страниц списка совещаний по (scope, направление, курсор).
+
+    Страницы сбрасываются целиком по scope: при записи совещания, заметки или напоминания -
+    у администраторов и принявших приглашение сотрудников, при записи приглашения - у его сотрудника.
+    """
+
+    def __init__(self, maxsize: int = MEETING_VIEW_CACHE_SIZE, ttl: float = MEETING_VIEW_CACHE_TTL):
+        super().__init__(maxsize, ttl)
+        self._scopes = {}  # scope -> ключи его страниц
+        self.invalidations = 0
+
+    def get(self, scope: str, direction: str, cursor: str):
+        # Страница - (текст, клавиатура)
+        return self.lookup((scope, direction, cursor))
+
+    def put(self, scope: str, direction: str, cursor: str, view: tuple):
+        key = (scope, direction, cursor)
+        self._scopes.setdefault(scope, set()).add(key)
+        self.store(key, view)
+
+    def _discard(self, key):
+        super()._discard(key)
+        keys = self._scopes.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[key[0]]
+
+    def invalidate(self, scopes):
+        for scope in scopes:
+            for key in self._scopes.pop(scope, ()):
+                self._entries.pop(key, None)
+        self.invalidations += 1
+
+    def clear(self):
+        super().clear()
+        self._scopes.clear()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "scopes": len(self._scopes), "invalidations": self.invalidations}
+
+meeting_views = MeetingViewCache()
+
+def invitees(meeting_ids):
+    # Сотрудники, у которых совещания есть в списке
+    return select(MeetingInvitation.user_id).filter(
+        MeetingInvitation.meeting_id.in_(meeting_ids),
+        MeetingInvitation.accepted == "accepted"
+    ).distinct()
+
+def invalidate_scopes(session, scopes: set):
+    invalidate_on_commit(session, lambda: meeting_views.invalidate(scopes))
+
+def publish_scopes(scopes: set, meeting_ids=()):
+    # Одна команда в транзакции записи: NOTIFY остальным экземплярам (уходит при commit, при откате - нет)
+    # со всеми затронутыми scope; для meeting_ids заодно возвращает id сотрудников, у которых они в списке
+    known = " ".join(sorted(scopes))
+    if not meeting_ids:
+        return select(func.pg_notify(VIEW_CHANNEL, known if len(known) <= NOTIFY_PAYLOAD_LIMIT else CLEAR_ALL), null())
+    users = invitees(meeting_ids).cte("users")
+    # Те же строки, что user_scope()
+    found = select(
+        func.concat_ws(" ", known, func.string_agg(literal("user:") + cast(users.c.user_id, Text), " ")).label("payload"),
+        func.array_agg(users.c.user_id).label("user_ids"),
+    ).subquery()
+    payload = case((func.length(found.c.payload) > NOTIFY_PAYLOAD_LIMIT, CLEAR_ALL), else_=found.c.payload)
+    return select(func.pg_notify(VIEW_CHANNEL, payload), found.c.user_ids)
+
+async def invalidate_meetings(session: AsyncSession, meeting_ids):
+    # Для массовых запросов, которые не проходят через flush; вызывать до изменения приглашений
+    _, user_ids = (await session.execute(publish_scopes({ADMIN_SCOPE}, meeting_ids))).one()
+    invalidate_scopes(session, {ADMIN_SCOPE, *(user_scope(user_id) for user_id in user_ids or ())})
+
+@event.listens_for(Session, "before_flush")
+def invalidate_changed_views(session, flush_context, instances):
+    # До flush в БД еще старые приглашения: у удаляемого совещания находятся все, кто его видел
+    meeting_ids, scopes = set(), set()
+    for obj in chain(session.new, session.deleted, (obj for obj in session.dirty if session.is_modified(obj))):
+        if isinstance(obj, Meeting):
+            scopes.add(ADMIN_SCOPE)
+            if obj.id is not None:
+                meeting_ids.add(obj.id)
+        elif isinstance(obj, (MeetingNote, Reminder)):
+            meeting_ids.add(obj.meeting_id)
+        elif isinstance(obj, MeetingInvitation):
+            scopes.add(user_scope(obj.user_id))
+    meeting_ids.discard(None)
+    if meeting_ids:
+        scopes.add(ADMIN_SCOPE)
+    if scopes:
+        _, user_ids = session.execute(publish_scopes(scopes, meeting_ids)).one()
+        scopes.update(user_scope(user_id) for user_id in user_ids or ())
+        invalidate_scopes(session, scopes)
+
+def on_views_changed(connection, pid, channel, payload):
+    # Страницы изменены в любом экземпляре бота (publish_scopes); свои уже сброшены, повтор безвреден
+    if payload == CLEAR_ALL:
+        meeting_views.clear()
+    else:
+        meeting_views.invalidate(payload.split())
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from app.config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+def create_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    app = web.Application()
+    # Запрос с неверным секретом отклоняется; на верный Telegram сразу получает ответ, а обновление обрабатывается в фоне
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET, handle_in_background=True).register(app, path=WEBHOOK_PATH)
+    # Запуск и остановка диспетчера (закрытие хранилища FSM и сессии бота) вместе с приложением
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+
+    runner = web.AppRunner(create_app(bot, dp))
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    await bot.set_webhook(
+        f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info(f"Webhook слушает {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,205 @@
+"""Общие части бенчмарков.
+
+Бенчмарки пересоздают таблицы, поэтому запускаются только на отдельной тестовой
+базе: адрес передается через --database-url или переменную BENCH_DATABASE_URL.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, InlineQuery, Message, Update, User as TgUser
+
+
+def parse_args(description: str, database: bool = True, **options) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="тестовая БД (по умолчанию BENCH_DATABASE_URL)")
+    for name, default in options.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+    if not database:
+        # Бенчмарк без БД: модули бота импортируются с адресом из окружения, соединения не открываются
+        return args
+    if not args.database_url:
+        parser.error("нужен --database-url или BENCH_DATABASE_URL (таблицы в этой базе будут пересозданы)")
+    # app.database читает DATABASE_URL при импорте, поэтому модули бота импортируются после этого вызова
+    os.environ["DATABASE_URL"] = args.database_url
+    return args
+
+
+class FakeBotSession(BaseSession):
+    """Сессия Bot API без сети: запоминает вызовы и отвечает заглушками."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = []
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None):
+        self.calls.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=len(self.calls),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    return Bot("42:BENCHMARK", session=FakeBotSession(latency))
+
+
+class UpdateFactory:
+    """Синтетические обновления от пользователя Telegram: сообщение, нажатие кнопки, inline-запрос."""
+
+    def __init__(self):
+        self.update_id = 0
+
+    def _next(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def message(self, telegram_id: int, text: str) -> Update:
+        update_id = self._next()
+        return Update(update_id=update_id, message=Message(
+            message_id=update_id, date=datetime.now(), chat=Chat(id=telegram_id, type="private"),
+            from_user=TgUser(id=telegram_id, is_bot=False, first_name=f"user{telegram_id}"), text=text,
+        ))
+
+    def callback(self, telegram_id: int, data: str) -> Update:
+        update_id = self._next()
+        # Кнопка под сообщением бота в личном чате пользователя
+        message = Message(
+            message_id=update_id, date=datetime.now(), chat=Chat(id=telegram_id, type="private"),
+            from_user=TgUser(id=42, is_bot=True, first_name="bot"), text="...",
+        )
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id), from_user=TgUser(id=telegram_id, is_bot=False, first_name=f"user{telegram_id}"),
+            chat_instance="benchmark", message=message, data=data,
+        ))
+
+    def inline_query(self, telegram_id: int, query: str) -> Update:
+        update_id = self._next()
+        return Update(update_id=update_id, inline_query=InlineQuery(
+            id=str(update_id), from_user=TgUser(id=telegram_id, is_bot=False, first_name=f"user{telegram_id}"),
+            query=query, offset="",
+        ))
+
+
+# Строк в одном INSERT при заполнении базы
+CHUNK = 10000
+
+
+def telegram_id(user_id: int) -> int:
+    return 100000 + user_id
+
+
+async def insert_rows(session, model, rows):
+    from sqlalchemy import insert
+
+    for i in range(0, len(rows), CHUNK):
+        await session.execute(insert(model), rows[i:i + CHUNK])
+
+
+async def seed_database(args: argparse.Namespace) -> dict:
+    """Пересоздает таблицы и заполняет их по числам из args; возвращает администраторов, создателей совещаний, сотрудников с принятыми приглашениями, приглашения и удаленных."""
+    from app.database import AsyncSessionLocal
+    from app.models import User, Meeting, MeetingInvitation, Reminder, MeetingNote, Feedback
+
+    await reset_schema()
+    now = datetime.now().replace(microsecond=0)
+    # 1% администраторов, 5% удаленных сотрудников
+    admins = [i for i in range(1, args.users + 1) if i % 100 == 0]
+    guests = [i for i in range(1, args.users + 1) if i % 100 and i % 20 != 1]
+    creators = {i: random.choice(admins) for i in range(1, args.meetings + 1)}
+    invitations = {}
+    for _ in range(args.invitations):
+        invitations[(random.randint(1, args.meetings), random.randint(1, args.users))] = random.choice(["accepted", "declined", None])
+    async with AsyncSessionLocal() as session:
+        await insert_rows(session, User, [
+            {"id": i, "telegram_id": telegram_id(i), "first_name": f"user{i}", "role": "admin" if i % 100 == 0 else "guest",
+             "deleted_flag": 1 if i % 20 == 1 else 0, "is_meeting_creator": 1 if i % 100 == 0 else 0}
+            for i in range(1, args.users + 1)
+        ])
+        await insert_rows(session, Meeting, [
+            {"id": i, "title": f"meeting{i}", "description": "", "creator_id": creators[i],
+             "scheduled_at": now + timedelta(minutes=random.randint(-60 * 24 * 30, 60 * 24 * 365))}
+            for i in range(1, args.meetings + 1)
+        ])
+        await insert_rows(session, MeetingInvitation, [
+            {"meeting_id": meeting_id, "user_id": user_id, "accepted": accepted}
+            for (meeting_id, user_id), accepted in invitations.items()
+        ])
+        await insert_rows(session, Reminder, [
+            {"meeting_id": random.randint(1, args.meetings), "user_id": random.randint(1, args.users),
+             "reminder_time": now + timedelta(minutes=random.randint(60, 60 * 24 * 365))}
+            for _ in range(args.reminders)
+        ])
+        await insert_rows(session, MeetingNote, [
+            {"meeting_id": random.randint(1, args.meetings), "user_id": random.randint(1, args.users), "note": "note"}
+            for _ in range(args.notes)
+        ])
+        # Почти все вопросы уже отвечены
+        await insert_rows(session, Feedback, [
+            {"user_id": random.choice(guests), "message": "?", "answered": 0 if i % 100 == 0 else 1}
+            for i in range(args.feedback)
+        ])
+        await session.commit()
+
+    accepted = defaultdict(list)
+    for (meeting_id, user_id), answer in invitations.items():
+        if answer == "accepted":
+            accepted[user_id].append(meeting_id)
+    return {"admins": admins, "creators": creators, "guests": [guest for guest in guests if accepted[guest]], "accepted": accepted,
+            "invitations": invitations, "deleted": [i for i in range(1, args.users + 1) if i % 20 == 1]}
+
+
+async def reset_schema():
+    from app.database import async_engine
+    from app.models import Base
+
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name: str, count: int, elapsed: float, latencies: list = None):
+    line = f"{name:40} {count:8d} за {elapsed:8.3f} с  {count / elapsed if elapsed else 0:10.1f}/с"
+    if latencies:
+        line += (f"  p50 {percentile(latencies, 50) * 1000:7.2f} мс"
+                 f"  p99 {percentile(latencies, 99) * 1000:7.2f} мс"
+                 f"  mean {statistics.mean(latencies) * 1000:7.2f} мс")
+    print(line)
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,91 @@
+"""Стоимость выбора обработчика в зависимости от числа кнопок.
+
+Сравнивает прежнюю схему (фильтры-lambda по тексту кнопки и префиксу callback_data,
+разложенные по десяти роутерам и проверяемые по очереди) с индексом app.commands
+на одинаковых наборах из N текстов и N префиксов. Обработчики пустые, БД не нужна:
+замеряется только путь обновления через Dispatcher.
+
+    python -m benchmarks.dispatch --sizes 10,100,1000 --updates 2000
+"""
+import asyncio
+import random
+from datetime import datetime
+from benchmarks.common import parse_args, make_bot, report, Timer
+
+args = parse_args(__doc__, database=False, sizes="10,100,1000", updates=2000, routers=10, seed=1)
+
+from aiogram import Dispatcher, Router
+from aiogram.types import CallbackQuery, Chat, Message, Update, User as TgUser
+from app.commands import CommandIndex, commands
+# Кнопки бота регистрируются в app.commands при импорте модулей обработчиков
+import handlers.router.users, handlers.router.meeting, handlers.router.reminders, handlers.router.note
+import handlers.router.feedback, handlers.router.pickers, handlers.people.participants
+import handlers.people.invitation, handlers.people.restore
+
+random.seed(args.seed)
+
+
+async def noop(event):
+    pass
+
+
+def filter_dispatcher(size: int) -> Dispatcher:
+    # Как раньше: каждая кнопка - отдельный обработчик со своим фильтром, роутеры подключены по порядку
+    dp = Dispatcher()
+    routers = [Router() for _ in range(args.routers)]
+    for i in range(size):
+        router = routers[i % args.routers]
+        router.message(lambda message, text=f"Кнопка {i}": message.text == text)(noop)
+        router.callback_query(lambda c, prefix=f"action{i}_": c.data.startswith(prefix))(noop)
+    for router in routers:
+        dp.include_router(router)
+    return dp
+
+
+def index_dispatcher(size: int) -> Dispatcher:
+    dp = Dispatcher()
+    index = CommandIndex()
+    for i in range(size):
+        index.message(f"Кнопка {i}")(noop)
+        index.callback_query(prefix=f"action{i}_")(noop)
+    dp.include_router(index.router())
+    return dp
+
+
+def make_updates(size: int) -> list:
+    user = TgUser(id=1, is_bot=False, first_name="bench")
+    chat = Chat(id=1, type="private")
+    updates = []
+    for update_id in range(args.updates):
+        i = random.randrange(size)
+        message = Message(message_id=update_id, date=datetime.now(), chat=chat, from_user=user, text=f"Кнопка {i}")
+        if update_id % 2:
+            updates.append(Update(update_id=update_id, message=message))
+        else:
+            updates.append(Update(update_id=update_id, callback_query=CallbackQuery(
+                id=str(update_id), from_user=user, chat_instance="bench", message=message, data=f"action{i}_{update_id}"
+            )))
+    return updates
+
+
+async def measure(name: str, dp: Dispatcher, updates: list):
+    bot = make_bot()
+    latencies = []
+    with Timer() as total:
+        for update in updates:
+            with Timer() as timer:
+                await dp.feed_update(bot, update)
+            latencies.append(timer.elapsed)
+    report(name, len(updates), total.elapsed, latencies)
+
+
+async def main():
+    print(f"кнопок в боте: текстов {len(commands.texts)}, callback_data {len(commands.callbacks)}, префиксов {len(commands.prefixes)}")
+    for size in map(int, args.sizes.split(",")):
+        updates = make_updates(size)
+        print(f"\nобработчиков: {size} текстов + {size} префиксов")
+        await measure("фильтры по очереди", filter_dispatcher(size), updates)
+        await measure("индекс app.commands", index_dispatcher(size), updates)
+
+
+asyncio.run(main())
@@ -0,0 +1,434 @@
+"""Нагрузочный тест всего процесса бота через эмулятор Bot API.
+
+Заполняет тестовую базу, поднимает локальный aiohttp-сервер с той частью Bot API, которой
+пользуется бот (getMe, getUpdates, setWebhook, deleteWebhook, sendMessage, editMessageText,
+editMessageReplyMarkup, answerCallbackQuery, answerInlineQuery), и запускает run.py
+отдельным процессом с TELEGRAM_API_URL на этот сервер. Работает весь процесс: polling или
+webhook (--mode), сессия aiohttp бота, очередь отправки и фоновые задачи.
+
+Тысячи пользователей одновременно проходят сценарии (список совещаний, напоминание, заметка,
+приглашение, участники совещания, встроенный поиск), нажимая кнопки из ответов бота и
+результатов встроенного поиска. --flood - доля вызовов
+отправки сообщений, на которые эмулятор отвечает 429 с retry_after. Выводятся обновления в
+секунду от отправки до первого ответа бота, p50/p99 шагов, незавершенные сценарии, вызовы
+Bot API по методам, среднее время обработчиков внутри бота (его страница метрик на
+--metrics-port) и память процесса бота (RSS из /proc) до, во время и после нагрузки.
+
+    python -m benchmarks.emulator --database-url postgresql://.../bench --clients 2000 --mode webhook --flood 0.01
+"""
+import asyncio
+import json
+import os
+import re
+import random
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from benchmarks.common import parse_args, report, seed_database, telegram_id, Timer
+
+args = parse_args(__doc__, users=5000, meetings=2000, invitations=20000, notes=10000, reminders=10000, feedback=500,
+                  clients=2000, flows=3, mode="polling", port=8081, webhook_port=8082, metrics_port=8083, flood=0.0, retry_after=1,
+                  reply_timeout=10.0, startup_timeout=60.0, seed=1)
+
+from aiohttp import ClientError, ClientSession, web
+
+ROOT = Path(__file__).resolve().parent.parent
+TOKEN = "42:EMULATOR"
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "emulator", "username": "emulator_bot"}
+WEBHOOK_SECRET = "emulator"
+# Суммы и количества гистограмм времени со страницы метрик бота
+METRIC_LINE = re.compile(r'^(bot_handler_seconds|bot_api_request_seconds)_(sum|count)\{\w+="([^"]*)"\} (\S+)$')
+# Вызовы, на которые эмулятор может ответить flood control
+SEND_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+# Сценарии: ("text", текст сообщения), ("press", callback_data), ("click", префикс кнопки из последних клавиатур бота),
+# ("inline", встроенный запрос) или ("choose", префикс кнопки из результатов последнего встроенного запроса)
+GUEST_FLOWS = {
+    "список совещаний": [("text", "Просмотреть совещания")],
+    "напоминание": [("text", "Добавить напоминание"), ("click", "select_meeting_reminder_"), ("text", "15")],
+    "заметка": [("text", "Добавить заметку"), ("click", "select_meeting_note_"), ("text", "Заметка")],
+    "профиль": [("press", "start_bot")],
+    "поиск": [("inline", "meeting")],
+}
+ADMIN_FLOWS = {
+    "список совещаний": [("text", "Просмотреть совещания")],
+    "приглашение": [("text", "Пригласить сотрудника на совещание"), ("click", "select_meeting_"),
+                    ("click", "select_user_"), ("click", "invite_selected")],
+    "участники совещания": [("text", "Посмотреть список сотрудников по совещаниям"), ("click", "view_invited_users_")],
+    "вопросы": [("text", "Ответить на вопросы")],
+    "приглашение через поиск": [("text", "Пригласить сотрудника на совещание"), ("click", "select_meeting_"),
+                                ("inline", "user"), ("choose", "select_user_")],
+}
+
+random.seed(args.seed)
+
+
+class Client:
+    """Пользователь Telegram: пишет боту и ждет ответов в своем чате."""
+
+    def __init__(self, user_id: int, admin: bool):
+        self.telegram_id = telegram_id(user_id)
+        self.user = {"id": self.telegram_id, "is_bot": False, "first_name": f"user{user_id}"}
+        self.admin = admin
+        self.replies = 0
+        self.keyboards = {}  # message_id -> сообщение бота с inline-клавиатурой, последние в конце
+        self.results = []  # результаты последнего встроенного запроса (answerInlineQuery)
+        self.changed = asyncio.Condition()
+
+    async def receive(self, message: dict = None, results: list = None):
+        async with self.changed:
+            self.replies += 1
+            if message and "inline_keyboard" in message.get("reply_markup", {}):
+                self.keyboards.pop(message["message_id"], None)
+                self.keyboards[message["message_id"]] = message
+            if results is not None:
+                self.results = results
+            self.changed.notify_all()
+
+    def button(self, prefix: str):
+        for message in reversed(list(self.keyboards.values())):
+            for row in message["reply_markup"]["inline_keyboard"]:
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        return message, button["callback_data"]
+        return None
+
+    def result_button(self, prefix: str):
+        # Кнопка под результатом встроенного поиска: нажатие приходит без сообщения, с inline_message_id
+        for result in self.results:
+            for row in result.get("reply_markup", {}).get("inline_keyboard", []):
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        return result["id"], button["callback_data"]
+        return None
+
+    async def wait(self, predicate):
+        async with self.changed:
+            try:
+                return await asyncio.wait_for(self.changed.wait_for(predicate), args.reply_timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+class Emulator:
+    """Bot API в памяти: раздает обновления через getUpdates или webhook и передает ответы бота пользователям."""
+
+    def __init__(self, clients: list):
+        self.clients = {client.telegram_id: client for client in clients}
+        self.callbacks = {}  # id нажатия кнопки -> пользователь, ждущий answerCallbackQuery
+        self.inline_queries = {}  # id встроенного запроса -> пользователь, ждущий answerInlineQuery
+        self.updates = []
+        self.new_updates = asyncio.Event()
+        self.update_id = 0
+        self.message_id = 0
+        self.webhook = None
+        self.http = None
+        self.deliveries = set()
+        self.ready = asyncio.Event()
+        self.calls = Counter()
+        self.floods = 0
+        self.errors = Counter()
+        self.methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "setWebhook": self.set_webhook,
+            "deleteWebhook": self.delete_webhook,
+            "sendMessage": self.send_message,
+            "editMessageText": self.edit_message,
+            "editMessageReplyMarkup": self.edit_message,
+            "answerCallbackQuery": self.answer_callback_query,
+            "answerInlineQuery": self.answer_inline_query,
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        if method in SEND_METHODS and random.random() < args.flood:
+            self.floods += 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {args.retry_after}",
+                "parameters": {"retry_after": args.retry_after},
+            })
+        handler = self.methods.get(method)
+        # Остальные методы (deleteMessage, ...) просто подтверждаются
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_me(self, params: dict):
+        return BOT_USER
+
+    async def get_updates(self, params: dict):
+        self.ready.set()
+        offset = int(params.get("offset", 0))
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:int(params.get("limit", 100))]
+
+    async def set_webhook(self, params: dict):
+        self.webhook = (params["url"], params.get("secret_token", ""))
+        self.ready.set()
+        return True
+
+    async def delete_webhook(self, params: dict):
+        self.webhook = None
+        return True
+
+    def bot_message(self, params: dict, message_id: int = None) -> dict:
+        if message_id is None:
+            self.message_id += 1
+            message_id = self.message_id
+        message = {"message_id": message_id, "date": int(time.time()), "chat": {"id": int(params["chat_id"]), "type": "private"},
+                   "from": BOT_USER, "text": params.get("text", "...")}
+        markup = json.loads(params.get("reply_markup") or "{}")
+        # Как в Telegram: в сообщении возвращается только inline-клавиатура, обычная остается у клиента
+        if "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        return message
+
+    async def deliver_to_chat(self, message: dict):
+        client = self.clients.get(message["chat"]["id"])
+        if client:
+            await client.receive(message)
+
+    async def send_message(self, params: dict):
+        message = self.bot_message(params)
+        await self.deliver_to_chat(message)
+        return message
+
+    async def edit_message(self, params: dict):
+        message = self.bot_message(params, int(params["message_id"]))
+        await self.deliver_to_chat(message)
+        return message
+
+    async def answer_callback_query(self, params: dict):
+        client = self.callbacks.pop(params["callback_query_id"], None)
+        if client:
+            await client.receive()
+        return True
+
+    async def answer_inline_query(self, params: dict):
+        # Результаты запоминаются у пользователя: из них сценарий нажимает кнопки ("choose")
+        client = self.inline_queries.pop(params["inline_query_id"], None)
+        if client:
+            await client.receive(results=json.loads(params.get("results") or "[]"))
+        return True
+
+    def message_update(self, client: Client, text: str) -> dict:
+        self.message_id += 1
+        return {"message": {"message_id": self.message_id, "date": int(time.time()),
+                            "chat": {"id": client.telegram_id, "type": "private"}, "from": client.user, "text": text}}
+
+    def callback_update(self, client: Client, data: str, message: dict = None, inline_message_id: str = None) -> dict:
+        callback_id = f"{client.telegram_id}:{self.update_id + 1}"
+        self.callbacks[callback_id] = client
+        if inline_message_id is not None:
+            # Кнопка сообщения, отправленного через встроенный поиск: бот его не видит
+            return {"callback_query": {"id": callback_id, "from": client.user, "chat_instance": "emulator",
+                                       "inline_message_id": inline_message_id, "data": data}}
+        if message is None:
+            message = {"message_id": 0, "date": int(time.time()), "chat": {"id": client.telegram_id, "type": "private"},
+                       "from": BOT_USER, "text": "..."}
+        return {"callback_query": {"id": callback_id, "from": client.user, "chat_instance": "emulator",
+                                   "message": message, "data": data}}
+
+    def inline_query_update(self, client: Client, query: str) -> dict:
+        query_id = f"{client.telegram_id}:{self.update_id + 1}"
+        self.inline_queries[query_id] = client
+        return {"inline_query": {"id": query_id, "from": client.user, "query": query, "offset": ""}}
+
+    async def push(self, update: dict):
+        self.update_id += 1
+        update["update_id"] = self.update_id
+        if self.webhook:
+            task = asyncio.create_task(self.deliver_webhook(update))
+            self.deliveries.add(task)
+            task.add_done_callback(self.deliveries.discard)
+        else:
+            self.updates.append(update)
+            self.new_updates.set()
+
+    async def deliver_webhook(self, update: dict):
+        url, secret = self.webhook
+        try:
+            async with self.http.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as response:
+                if response.status != 200:
+                    self.errors[f"webhook HTTP {response.status}"] += 1
+        except ClientError as e:
+            self.errors[f"webhook {type(e).__name__}"] += 1
+
+
+async def run_client(emulator: Emulator, client: Client, latencies: dict, failures: Counter):
+    flows = ADMIN_FLOWS if client.admin else GUEST_FLOWS
+    for name in random.choices(list(flows), k=args.flows):
+        # Кнопки прошлых сценариев не нажимаются
+        client.keyboards.clear()
+        client.results = []
+        for kind, value in flows[name]:
+            if kind == "click":
+                found = await client.wait(lambda: client.button(value))
+                if not found:
+                    failures[f"{name}: нет кнопки {value}"] += 1
+                    break
+                update = emulator.callback_update(client, found[1], found[0])
+            elif kind == "choose":
+                found = client.result_button(value)
+                if not found:
+                    failures[f"{name}: нет результата с кнопкой {value}"] += 1
+                    break
+                update = emulator.callback_update(client, found[1], inline_message_id=found[0])
+            elif kind == "inline":
+                update = emulator.inline_query_update(client, value)
+            elif kind == "press":
+                update = emulator.callback_update(client, value)
+            else:
+                update = emulator.message_update(client, value)
+            replies = client.replies
+            start = time.perf_counter()
+            await emulator.push(update)
+            if not await client.wait(lambda: client.replies > replies):
+                failures[f"{name}: нет ответа"] += 1
+                break
+            latencies[value].append(time.perf_counter() - start)
+
+
+def rss(pid: int) -> int:
+    # Резидентная память процесса в КБ (Linux)
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+async def sample_memory(pid: int, samples: list):
+    while True:
+        samples.append(rss(pid))
+        await asyncio.sleep(0.5)
+
+
+async def bot_metrics(http: ClientSession) -> dict:
+    # Время внутри процесса бота (app.metrics): метрика -> значение метки -> {"sum": ..., "count": ...}
+    series = defaultdict(lambda: defaultdict(dict))
+    try:
+        async with http.get(f"http://127.0.0.1:{args.metrics_port}/metrics") as response:
+            text = await response.text()
+    except ClientError:
+        return series
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, kind, label, value = match.groups()
+            series[name][label][kind] = float(value)
+    return series
+
+
+async def start_bot(log_dir: str):
+    env = dict(os.environ)
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env.update({
+        "TOKEN": TOKEN,
+        "DATABASE_URL": args.database_url,
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{args.port}",
+        "BOT_MODE": args.mode,
+        "WEBHOOK_URL": f"http://127.0.0.1:{args.webhook_port}",
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "WEBAPP_HOST": "127.0.0.1",
+        "WEBAPP_PORT": str(args.webhook_port),
+        "METRICS_PORT": str(args.metrics_port),
+        "METRICS_PATH": "/metrics",
+        "LOG_DIR": log_dir,
+    })
+    return await asyncio.create_subprocess_exec(sys.executable, str(ROOT / "run.py"), cwd=ROOT, env=env)
+
+
+async def stop_bot(process):
+    if process.returncode is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(process.wait(), 15)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+async def main():
+    print(f"пользователей {args.users}, совещаний {args.meetings}, приглашений {args.invitations}, "
+          f"клиентов {args.clients} по {args.flows} сценария, режим {args.mode}, 429 на {args.flood:.1%} отправок")
+    data = await seed_database(args)
+    users = data["admins"] + data["guests"]
+    clients = [Client(user_id, user_id in data["admins"]) for user_id in random.sample(users, min(args.clients, len(users)))]
+    emulator = Emulator(clients)
+
+    runner = web.AppRunner(emulator.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    emulator.http = ClientSession()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        process = await start_bot(log_dir)
+        try:
+            ready = asyncio.create_task(emulator.ready.wait())
+            exited = asyncio.create_task(process.wait())
+            await asyncio.wait({ready, exited}, timeout=args.startup_timeout, return_when=asyncio.FIRST_COMPLETED)
+            exited.cancel()
+            if not emulator.ready.is_set():
+                ready.cancel()
+                raise RuntimeError(f"бот не начал получать обновления за {args.startup_timeout} с")
+
+            memory = []
+            sampler = asyncio.create_task(sample_memory(process.pid, memory))
+            idle = rss(process.pid)
+            latencies, failures = defaultdict(list), Counter()
+            with Timer() as total:
+                await asyncio.gather(*(run_client(emulator, client, latencies, failures) for client in clients))
+            # Догоняющие задачи бота (очередь отправки, фоновая обработка webhook)
+            await asyncio.sleep(2)
+            sampler.cancel()
+            after = rss(process.pid)
+            inside = await bot_metrics(emulator.http)
+        finally:
+            await stop_bot(process)
+            await emulator.http.close()
+            await runner.cleanup()
+
+    print()
+    for step, values in latencies.items():
+        report(step, len(values), sum(values), values)
+    report("все шаги с ответом бота", sum(map(len, latencies.values())), total.elapsed,
+           [value for values in latencies.values() for value in values])
+    print(f"сценариев {len(clients) * args.flows}, прерваны {sum(failures.values())}")
+    for reason, count in failures.most_common():
+        print(f"  {reason:50} {count:6d}")
+    print(f"вызовы Bot API (429 отдано {emulator.floods}):")
+    for method, count in emulator.calls.most_common():
+        print(f"  {method:50} {count:6d}")
+    for error, count in emulator.errors.most_common():
+        print(f"  {error:50} {count:6d}")
+    for name, title in (("bot_handler_seconds", "обработчики"), ("bot_api_request_seconds", "вызовы Bot API")):
+        if inside[name]:
+            print(f"внутри бота, {title} (среднее):")
+        for label, values in sorted(inside[name].items(), key=lambda item: -item[1]["sum"]):
+            print(f"  {label:60} {int(values['count']):6d}  {values['sum'] / values['count'] * 1000:7.2f} мс")
+    if idle:
+        print(f"память бота: до нагрузки {idle / 1024:.1f} МБ, пик {max(memory) / 1024:.1f} МБ, "
+              f"после {after / 1024:.1f} МБ (рост {(after - idle) / 1024:+.1f} МБ)")
+
+
+asyncio.run(main())
@@ -0,0 +1,126 @@
+"""Проверка хранилища FSM (app.storage.PostgresStorage): истечение диалогов и число команд записи.
+
+Для каждой проверки ключ FSM записывается, при необходимости "стареет" (updated_at сдвигается
+дальше state_ttl) и читается обратно. Брошенный диалог должен читаться пустым, а запись
+одного поля не должна возвращать к жизни второе. Команды к БД считает слушатель
+before_cursor_execute на движке хранилища: запись ключа за обновление - одна команда, запись
+без изменений - ни одной (чтения не считаются). При нарушениях код выхода 1.
+
+    python -m benchmarks.fsm_storage --database-url postgresql://.../bench
+"""
+import asyncio
+import sys
+from datetime import timedelta
+from benchmarks.common import parse_args, reset_schema
+
+args = parse_args(__doc__, state_ttl=60)
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import event, func, select, update
+from app.database import fsm_engine
+from app.models import FsmRecord
+from app.storage import PostgresStorage
+
+storage = PostgresStorage(state_ttl=args.state_ttl)
+statements = []
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    # Только записи: чтения без слушателя NOTIFY не кэшируются и здесь не проверяются
+    if not statement.lstrip().startswith("SELECT"):
+        statements.append(statement)
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+async def expire(user_id: int):
+    # Диалог брошен: последнее изменение было раньше state_ttl
+    async with fsm_engine.connect() as connection:
+        await connection.execute(
+            update(FsmRecord).where(FsmRecord.key == storage.key_builder.build(key(user_id)))
+            .values(updated_at=FsmRecord.updated_at - timedelta(seconds=args.state_ttl * 2))
+        )
+
+
+async def rows(user_id: int) -> int:
+    async with fsm_engine.connect() as connection:
+        return await connection.scalar(
+            select(func.count()).select_from(FsmRecord).where(FsmRecord.key == storage.key_builder.build(key(user_id)))
+        )
+
+
+async def read(user_id: int) -> tuple:
+    return await storage.get_state(key(user_id)), await storage.get_data(key(user_id))
+
+
+async def write(user_id: int, *, state=..., data=...):
+    # Как одно обновление бота: изменения за обновление пишутся при выходе из batch()
+    async with storage.batch():
+        if state is not ...:
+            await storage.set_state(key(user_id), state)
+        if data is not ...:
+            await storage.set_data(key(user_id), data)
+
+
+async def counted(operation) -> int:
+    statements.clear()
+    await operation
+    return len(statements)
+
+
+async def main():
+    await reset_schema()
+    event.listen(fsm_engine.sync_engine, "before_cursor_execute", count_statement)
+    results = []
+
+    def check(name: str, actual, expected):
+        results.append((name, actual, expected))
+
+    # 1. Брошенный диалог читается пустым
+    await write(1, state="MeetingStates:scheduled_at", data={"meeting_title": "t"})
+    await expire(1)
+    check("брошенный диалог пуст", await read(1), (None, {}))
+
+    # 2. Запись только данных не возвращает старое состояние (update_data в select_meeting_for_invitation)
+    await storage.update_data(key(1), {"meeting_id": 7})
+    check("set_data после истечения", await read(1), (None, {"meeting_id": 7}))
+
+    # 3. Запись только состояния не возвращает старые данные
+    await write(2, state="NoteStates:select_meeting", data={"meeting_id": 3})
+    await expire(2)
+    await storage.set_state(key(2), "NoteStates:note_text")
+    check("set_state после истечения", await read(2), ("NoteStates:note_text", {}))
+
+    # 4. Брошенный диалог удаляет очистка
+    await write(3, state="ReminderStates:minutes", data={"meeting_id": 5})
+    await expire(3)
+    await storage.sweep()
+    check("строк после очистки", await rows(3), 0)
+
+    # 5. Живой диалог: запись одного поля сохраняет второе
+    await write(4, state="InviteStates:select_user", data={"meeting_id": 9})
+    await storage.update_data(key(4), {"invitees": [1]})
+    check("живой диалог сохраняет состояние", await read(4), ("InviteStates:select_user", {"meeting_id": 9, "invitees": [1]}))
+
+    # 6. Команды записи
+    check("записей: состояние и данные за обновление", await counted(write(5, state="S", data={"x": 1})), 1)
+    check("записей: то же значение еще раз", await counted(write(5, state="S", data={"x": 1})), 0)
+    check("записей: clear() без состояния", await counted(write(6, state=None, data={})), 0)
+    check("записей: clear() с состоянием", await counted(write(5, state=None, data={})), 1)
+    check("строк после clear()", await rows(5), 0)
+
+    await storage.close()
+    failures = 0
+    print(f"{'проверка':45} {'результат':>40}")
+    for name, actual, expected in results:
+        ok = actual == expected
+        failures += not ok
+        print(f"{name:45} {str(actual):>40}  {'ok' if ok else f'ожидалось {expected}'}")
+    if failures:
+        print(f"\nнарушений: {failures}")
+        sys.exit(1)
+
+
+asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Скорость обработчиков бота без Telegram.
+
+Заполняет тестовую базу, собирает настоящий Dispatcher (app.dispatcher.build_dispatcher:
+все middleware и роутеры) и прогоняет через него синтетические обновления типичных
+сценариев. Bot API заменен сессией в памяти, которая запоминает исходящие вызовы.
+Для каждого шага сценария выводятся пропускная способность и p50/p99, затем по
+обработчикам - среднее время и число запросов к БД из app.metrics.
+
+    python -m benchmarks.handlers --database-url postgresql://.../bench --users 2000 --repeat 200
+"""
+import asyncio
+import random
+from collections import defaultdict
+from benchmarks.common import parse_args, make_bot, report, seed_database, telegram_id, Timer, UpdateFactory
+
+args = parse_args(__doc__, users=2000, meetings=2000, invitations=20000, notes=10000, reminders=10000,
+                  feedback=1000, repeat=200, latency=0.0, seed=1)
+
+from app.dispatcher import build_dispatcher
+from app.metrics import handler_seconds, handler_db_queries
+from app.sender import send_queue, TokenBucket
+
+# Лимиты Telegram сняты: рассылки из обработчиков не должны ждать очереди отправки
+send_queue.bucket = TokenBucket(1000000)
+send_queue.chat_interval = 0.0
+
+random.seed(args.seed)
+updates = UpdateFactory()
+
+
+def scenarios(data: dict) -> dict:
+    # Сценарий - шаги одного пользователя подряд: (имя шага, обновление); шаги с состоянием FSM идут после своего начала
+    admins, guests, accepted = data["admins"], data["guests"], data["accepted"]
+
+    def guest():
+        user_id = random.choice(guests)
+        return telegram_id(user_id), random.choice(accepted[user_id])
+
+    def admin():
+        return telegram_id(random.choice(admins))
+
+    def reminder():
+        user, meeting_id = guest()
+        return [("Добавить напоминание", updates.message(user, "Добавить напоминание")),
+                ("select_meeting_reminder_", updates.callback(user, f"select_meeting_reminder_{meeting_id}")),
+                ("минуты напоминания", updates.message(user, "15"))]
+
+    def note():
+        user, meeting_id = guest()
+        return [("Добавить заметку", updates.message(user, "Добавить заметку")),
+                ("select_meeting_note_", updates.callback(user, f"select_meeting_note_{meeting_id}")),
+                ("текст заметки", updates.message(user, "Заметка"))]
+
+    def question():
+        user, _ = guest()
+        return [("Задать вопрос", updates.message(user, "Задать вопрос")),
+                ("текст вопроса", updates.message(user, "Вопрос?"))]
+
+    def invite():
+        user = admin()
+        return [("Пригласить сотрудника на совещание", updates.message(user, "Пригласить сотрудника на совещание")),
+                ("select_meeting_", updates.callback(user, f"select_meeting_{random.randint(1, args.meetings)}"))]
+
+    return {
+        "список совещаний сотрудника": lambda: [("Просмотреть совещания (сотрудник)", updates.message(guest()[0], "Просмотреть совещания"))],
+        "список совещаний администратора": lambda: [("Просмотреть совещания (админ)", updates.message(admin(), "Просмотреть совещания"))],
+        "напоминание": reminder,
+        "заметка": note,
+        "вопрос": question,
+        "вопросы администратору": lambda: [("Ответить на вопросы", updates.message(admin(), "Ответить на вопросы"))],
+        "приглашение": invite,
+        "участники совещания": lambda: [("view_invited_users_", updates.callback(admin(), f"view_invited_users_{random.randint(1, args.meetings)}"))],
+        "удаление сотрудника": lambda: [("Удалить сотрудника", updates.message(admin(), "Удалить сотрудника"))],
+        "страница выбора": lambda: [("pick:dg", updates.callback(admin(), f"pick:dg:{random.randint(1, args.users)}:0"))],
+        "удаление совещания": lambda: [("Удалить совещание", updates.message(admin(), "Удалить совещание"))],
+        "восстановление": lambda: [("Восстановить сотрудника", updates.message(admin(), "Восстановить сотрудника"))],
+        "inline-поиск": lambda: [("inline-поиск", updates.inline_query(admin(), f"user{random.randint(1, 99)}"))],
+        "профиль": lambda: [("start_bot", updates.callback(guest()[0], "start_bot"))],
+        "непонятное сообщение": lambda: [("неизвестный текст", updates.message(guest()[0], "привет"))],
+    }
+
+
+async def main():
+    print(f"пользователей {args.users}, совещаний {args.meetings}, приглашений {args.invitations}, "
+          f"напоминаний {args.reminders}, заметок {args.notes}, вопросов {args.feedback}")
+    data = await seed_database(args)
+    dp = build_dispatcher()
+    bot = make_bot(args.latency)
+    send_queue.start()
+
+    latencies = defaultdict(list)
+    flows = list(scenarios(data).values())
+    with Timer() as total:
+        for _ in range(args.repeat):
+            for flow in flows:
+                for name, update in flow():
+                    with Timer() as timer:
+                        await dp.feed_update(bot, update)
+                    latencies[name].append(timer.elapsed)
+    await dp.storage.close()
+
+    print("\nшаги сценариев")
+    for name, values in latencies.items():
+        report(name, len(values), sum(values), values)
+    print(f"\nвсего {sum(map(len, latencies.values()))} обновлений за {total.elapsed:.3f} с, "
+          f"вызовов Bot API {len(bot.session.calls)}")
+
+    print("\nобработчики (app.metrics)")
+    for label, histogram in sorted(handler_seconds.series.items(), key=lambda item: -item[1].sum):
+        queries = handler_db_queries.series[label]
+        print(f"  {label:60} {histogram.count:6d}  {histogram.sum / histogram.count * 1000:7.2f} мс"
+              f"  запросов к БД {queries.sum / queries.count:5.1f}")
+    await send_queue.stop()
+
+
+asyncio.run(main())
@@ -0,0 +1,109 @@
+"""Стоимость логирования для цикла событий.
+
+Каждое «обновление» пишет строку aiogram об обработке, строку обработчика и
+отладочную строку. Сравниваются прежние синхронные FileHandler и app.logs: очередь
+с записью в отдельном потоке, без прореживания и с ним, в текстовом формате и в JSON.
+Время в цикле - сколько обновления ждали логирования; дозапись - сколько потоку
+осталось дописать после последнего обновления. БД не нужна, файлы пишутся во
+временный каталог; --write-delay добавляет задержку к каждой записи в файл
+(медленный или сетевой диск), в миллисекундах.
+
+    python -m benchmarks.logs --updates 50000 --write-delay 0.2
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from benchmarks.common import parse_args, report, Timer
+
+args = parse_args(__doc__, database=False, updates=50000, sample=10, write_delay=0.0)
+
+from app.logs import UPDATE_LOGGER, setup_logging
+
+update_logger = logging.getLogger(UPDATE_LOGGER)
+handler_logger = logging.getLogger("handlers.router.meeting")
+
+
+class SlowStream:
+    """Файл, каждая запись в который занимает не меньше delay секунд."""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def slow_down(handlers):
+    if args.write_delay:
+        for handler in handlers:
+            handler.stream = SlowStream(handler.stream, args.write_delay / 1000)
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def file_handlers(directory: str):
+    # Как было в run.py: два FileHandler на корневом логгере, запись прямо из цикла событий
+    reset_root()
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for name, level in (("info.log", logging.INFO), ("error.log", logging.ERROR)):
+        handler = logging.FileHandler(os.path.join(directory, name))
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    slow_down(root.handlers)
+
+
+def queue_handlers(directory: str, **options):
+    reset_root()
+    listener = setup_logging(directory=directory, level="DEBUG", console=False, **options)
+    slow_down(listener.handlers)
+    return listener
+
+
+async def handle(update_id: int):
+    handler_logger.debug(f"Обновление {update_id}: поиск совещаний")
+    handler_logger.info(f"Пользователь {update_id % 1000} открыл список совещаний")
+    update_logger.info("Update id=%s is handled. Duration %d ms by bot id=%d", update_id, 3, 42)
+
+
+async def measure(name: str, configure, **options):
+    with tempfile.TemporaryDirectory() as directory:
+        listener = configure(directory, **options)
+        latencies = []
+        with Timer() as total:
+            for update_id in range(args.updates):
+                with Timer() as timer:
+                    await handle(update_id)
+                latencies.append(timer.elapsed)
+        with Timer() as drain:
+            if listener:
+                listener.stop()
+        reset_root()
+        size = sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory))
+    report(name, args.updates, total.elapsed, latencies)
+    print(f"  дозапись {drain.elapsed:.3f} с, записано {size / 1024:.0f} КБ")
+
+
+async def main():
+    print(f"обновлений {args.updates}, задержка записи {args.write_delay} мс")
+    await measure("FileHandler в цикле событий", file_handlers)
+    await measure("очередь, все строки", queue_handlers, update_sample=1)
+    await measure(f"очередь, 1/{args.sample} строк обновлений", queue_handlers, update_sample=args.sample)
+    await measure(f"очередь JSON, 1/{args.sample}", queue_handlers, update_sample=args.sample, log_format="json")
+
+
+asyncio.run(main())
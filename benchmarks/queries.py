@@ -0,0 +1,111 @@
+"""Время запросов обработчиков без индексов и с индексами миграций 0002 и 0008.
+
+Заполняет тестовую базу большим набором данных (benchmarks.common.seed_database), снимает
+индексы из migrations/0002_hot_query_indexes.sql и уникальный индекс приглашений из 0008,
+замеряет каждый запрос, затем применяет обе миграции и замеряет снова. Для каждого
+запроса выводится, как план читает таблицы.
+
+    python -m benchmarks.queries --database-url postgresql://.../bench --users 20000
+"""
+import asyncio
+import json
+import random
+import re
+from datetime import datetime, timedelta
+from benchmarks.common import parse_args, report, seed_database, Timer
+
+args = parse_args(__doc__, users=20000, meetings=20000, invitations=200000, reminders=100000,
+                  notes=100000, feedback=50000, repeat=200, seed=1)
+
+import asyncpg
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from app.database import AsyncSessionLocal, ASYNCPG_DSN
+from app.migrations import MIGRATIONS_DIR
+from app.models import User, Meeting, MeetingInvitation, Reminder, MeetingNote, Feedback
+
+MIGRATION = MIGRATIONS_DIR / "0002_hot_query_indexes.sql"
+INDEXES = re.findall(r'CREATE INDEX IF NOT EXISTS "?(\w+)"?', MIGRATION.read_text(encoding="utf-8"))
+# Уникальный индекс приглашений (миграция 0008) тоже начинается с meeting_id: без него сравнение честное
+UNIQUE_MIGRATION = MIGRATIONS_DIR / "0008_invitation_unique.sql"
+UNIQUE_INDEXES = re.findall(r'CREATE UNIQUE INDEX IF NOT EXISTS "?(\w+)"?', UNIQUE_MIGRATION.read_text(encoding="utf-8"))
+
+random.seed(args.seed)
+now = datetime.now().replace(microsecond=0)
+
+
+# Запросы обработчиков: имя -> функция, возвращающая запрос со случайными параметрами
+QUERIES = {
+    "совещания сотрудника (напоминания, заметки)": lambda: select(Meeting).join(MeetingInvitation).filter(
+        MeetingInvitation.user_id == random.randint(1, args.users),
+        MeetingInvitation.accepted == "accepted",
+        Meeting.scheduled_at >= now,
+    ).order_by(Meeting.scheduled_at),
+    "участники совещания": lambda: select(MeetingInvitation).filter(
+        MeetingInvitation.meeting_id == random.randint(1, args.meetings),
+        MeetingInvitation.accepted == "accepted",
+    ),
+    "страница списка совещаний": lambda: select(Meeting).filter(
+        tuple_(Meeting.scheduled_at, Meeting.id) > tuple_(now + timedelta(days=random.randint(-365, 365)), 0)
+    ).order_by(Meeting.scheduled_at, Meeting.id).limit(6),
+    "совещания создателя": lambda: select(Meeting).filter(
+        Meeting.creator_id == random.randrange(100, args.users + 1, 100)
+    ),
+    "наступившие напоминания": lambda: select(Reminder).filter(Reminder.reminder_time <= now),
+    "напоминания совещания": lambda: select(Reminder).filter(Reminder.meeting_id == random.randint(1, args.meetings)),
+    "заметки совещания": lambda: select(MeetingNote).filter(MeetingNote.meeting_id == random.randint(1, args.meetings)),
+    "неотвеченные вопросы": lambda: select(Feedback).filter(Feedback.answered == 0),
+    "администраторы": lambda: select(User).filter(User.role == "admin"),
+    "удаленные сотрудники": lambda: select(User).filter(User.role == "guest", User.deleted_flag == 1),
+}
+
+
+def scans(node: dict) -> list:
+    # Узлы чтения таблиц: Seq Scan без индекса или Index/Bitmap Scan по индексу
+    found = [node] if "Relation Name" in node or "Index Name" in node else []
+    for child in node.get("Plans", []):
+        found += scans(child)
+    return found
+
+
+def describe_plan(plan) -> str:
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return ", ".join(f'{node["Node Type"]} {node.get("Index Name") or node["Relation Name"]}' for node in scans(plan[0]["Plan"]))
+
+
+async def measure(label: str):
+    print(f"\n{label}")
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("ANALYZE"))
+        for name, build in QUERIES.items():
+            sql = str(build().compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = await session.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            latencies = []
+            with Timer() as total:
+                for _ in range(args.repeat):
+                    with Timer() as timer:
+                        (await session.scalars(build())).all()
+                    latencies.append(timer.elapsed)
+                    # Карта идентичности не должна расти от повтора к повтору
+                    session.expunge_all()
+            print(f"  {describe_plan(plan)}")
+            report(name, args.repeat, total.elapsed, latencies)
+
+
+async def main():
+    print(f"пользователей {args.users}, совещаний {args.meetings}, приглашений {args.invitations}, "
+          f"напоминаний {args.reminders}, заметок {args.notes}, вопросов {args.feedback}")
+    await seed_database(args)
+    connection = await asyncpg.connect(ASYNCPG_DSN)
+    try:
+        for name in INDEXES + UNIQUE_INDEXES:
+            await connection.execute(f'DROP INDEX IF EXISTS "{name}"')
+        await measure("без индексов 0002 и 0008")
+        await connection.execute(MIGRATION.read_text(encoding="utf-8"))
+        await connection.execute(UNIQUE_MIGRATION.read_text(encoding="utf-8"))
+        await measure("с индексами 0002 и 0008")
+    finally:
+        await connection.close()
+
+
+asyncio.run(main())
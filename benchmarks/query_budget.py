@@ -0,0 +1,182 @@
+"""Число запросов к БД в обработчиках: поиск N+1 и бюджеты запросов.
+
+Каждый шаг сценариев проходит через настоящий Dispatcher (app.dispatcher.build_dispatcher)
+на двух тестовых базах: размера N и 10N. Совещаний в обеих базах одинаково, поэтому
+приглашений, заметок и напоминаний на совещание и сотрудника в 10 раз больше, а
+неотвеченных вопросов - в 10 раз больше всего. Состояния FSM хранятся в памяти, поэтому
+запросы PostgresStorage в счет не входят. Перед каждым шагом кэши пользователей,
+страниц совещаний и поиска очищаются. Запросы считает слушатель before_cursor_execute
+на движке БД, но только в задаче, которая обрабатывает шаг: фоновые задачи (очередь
+отправки, слушатели NOTIFY) в счет не попадают.
+
+Шаг не проходит проверку, если на 10N запросов больше, чем на N (запрос в цикле по
+строкам), или больше бюджета из BUDGETS. При нарушениях код выхода 1, поэтому скрипт
+можно запускать перед выкладкой.
+
+    python -m benchmarks.query_budget --database-url postgresql://.../bench --size 200
+"""
+import argparse
+import asyncio
+import random
+import sys
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from benchmarks.common import parse_args, make_bot, seed_database, telegram_id, UpdateFactory
+
+args = parse_args(__doc__, size=200, meetings=20, seed=1)
+
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import event
+from app.database import async_engine
+from app.dispatcher import build_dispatcher
+from app.sender import send_queue, TokenBucket
+from app.users import user_cache
+from app.views import meeting_views
+from handlers.router.search import search_cache
+
+# Рассылки из обработчиков не ждут лимитов Telegram
+send_queue.bucket = TokenBucket(1000000)
+send_queue.chat_interval = 0.0
+
+# Наибольшее допустимое число запросов за обновление, включая поиск пользователя в middleware
+BUDGETS = {
+    "Просмотреть совещания (сотрудник)": 4,
+    "Просмотреть совещания (админ)": 4,
+    "Добавить напоминание": 2,
+    "select_meeting_reminder_": 2,
+    "минуты напоминания": 4,
+    "Добавить заметку": 2,
+    "select_meeting_note_": 2,
+    "текст заметки": 4,
+    "Задать вопрос": 1,
+    "текст вопроса": 3,
+    "Ответить на вопросы": 2,
+    "Пригласить сотрудника на совещание": 2,
+    "select_meeting_": 2,
+    "select_user_": 1,
+    "invite_selected": 5,
+    "Посмотреть список сотрудников по совещаниям": 2,
+    # Удаление приглашений удаленных сотрудников: + NOTIFY страниц совещаний другим экземплярам
+    "view_invited_users_": 4,
+    "Удалить сотрудника": 2,
+    "Удалить совещание": 2,
+    "Восстановить сотрудника": 2,
+    "inline-поиск": 3,
+    "start_bot": 1,
+    "неизвестный текст": 1,
+}
+
+updates = UpdateFactory()
+
+
+# Счетчик шага, который выполняется в текущей задаче asyncio
+active_counter: ContextVar[Optional["QueryCounter"]] = ContextVar("active_counter", default=None)
+
+
+class QueryCounter:
+    """Число запросов к БД внутри блока with, сделанных из той же задачи asyncio."""
+
+    def __init__(self):
+        self.count = 0
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        if active_counter.get() is self:
+            self.count += 1
+
+    def __enter__(self):
+        self.token = active_counter.set(self)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self.count_query)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self.count_query)
+        active_counter.reset(self.token)
+
+
+def dataset(scale: int) -> argparse.Namespace:
+    size = args.size * scale
+    return argparse.Namespace(users=size, meetings=args.meetings, invitations=size * 2, notes=size, reminders=size, feedback=size)
+
+
+def steps(data: dict) -> list:
+    # Самые нагруженные участники: сотрудник с наибольшим числом принятых приглашений и совещание с наибольшим числом участников
+    user_id = max(data["guests"], key=lambda guest: len(data["accepted"][guest]))
+    guest = telegram_id(user_id)
+    meeting_id = data["accepted"][user_id][0]
+    busiest = Counter(meeting for meetings in data["accepted"].values() for meeting in meetings).most_common(1)[0][0]
+    # На обеих базах шаги идут по одним ветвям: приглашается еще не приглашенный сотрудник,
+    # а в списке участников есть удаленный сотрудник, чье приглашение удаляется
+    invitee = next(guest for guest in data["guests"] if (busiest, guest) not in data["invitations"])
+    with_deleted = Counter(meeting for user in data["deleted"] for meeting in data["accepted"][user]).most_common(1)[0][0]
+    admin = telegram_id(data["admins"][0])
+    # Пригласить на совещание может только его создатель
+    creator = telegram_id(data["creators"][busiest])
+    return [
+        ("Просмотреть совещания (сотрудник)", updates.message(guest, "Просмотреть совещания")),
+        ("Просмотреть совещания (админ)", updates.message(admin, "Просмотреть совещания")),
+        ("Добавить напоминание", updates.message(guest, "Добавить напоминание")),
+        ("select_meeting_reminder_", updates.callback(guest, f"select_meeting_reminder_{meeting_id}")),
+        ("минуты напоминания", updates.message(guest, "15")),
+        ("Добавить заметку", updates.message(guest, "Добавить заметку")),
+        ("select_meeting_note_", updates.callback(guest, f"select_meeting_note_{meeting_id}")),
+        ("текст заметки", updates.message(guest, "Заметка")),
+        ("Задать вопрос", updates.message(guest, "Задать вопрос")),
+        ("текст вопроса", updates.message(guest, "Вопрос?")),
+        ("Ответить на вопросы", updates.message(admin, "Ответить на вопросы")),
+        ("Пригласить сотрудника на совещание", updates.message(creator, "Пригласить сотрудника на совещание")),
+        ("select_meeting_", updates.callback(creator, f"select_meeting_{busiest}")),
+        ("select_user_", updates.callback(creator, f"select_user_{invitee}")),
+        ("invite_selected", updates.callback(creator, "invite_selected")),
+        ("Посмотреть список сотрудников по совещаниям", updates.message(admin, "Посмотреть список сотрудников по совещаниям")),
+        ("view_invited_users_", updates.callback(admin, f"view_invited_users_{with_deleted}")),
+        ("Удалить сотрудника", updates.message(admin, "Удалить сотрудника")),
+        ("Удалить совещание", updates.message(admin, "Удалить совещание")),
+        ("Восстановить сотрудника", updates.message(admin, "Восстановить сотрудника")),
+        ("inline-поиск", updates.inline_query(admin, "user1")),
+        ("start_bot", updates.callback(guest, "start_bot")),
+        ("неизвестный текст", updates.message(guest, "привет")),
+    ]
+
+
+async def count_queries(dp, bot, scale: int) -> dict:
+    random.seed(args.seed)
+    data = await seed_database(dataset(scale))
+    counts = {}
+    for name, update in steps(data):
+        user_cache.clear()
+        meeting_views.clear()
+        search_cache.clear()
+        with QueryCounter() as counter:
+            await dp.feed_update(bot, update)
+        counts[name] = counter.count
+    return counts
+
+
+async def main():
+    # Роутеры бота подключаются к одному Dispatcher, поэтому он общий для обеих баз.
+    # Состояния FSM в памяти: бюджеты считают запросы обработчиков, а не хранилища
+    dp = build_dispatcher(MemoryStorage())
+    bot = make_bot()
+    send_queue.start()
+    small = await count_queries(dp, bot, 1)
+    large = await count_queries(dp, bot, 10)
+    await send_queue.stop()
+    await dp.storage.close()
+
+    print(f"{'шаг':45} {'N=' + str(args.size):>8} {'10N':>8} {'бюджет':>8}")
+    failures = 0
+    for name, budget in BUDGETS.items():
+        problems = []
+        if large[name] > small[name]:
+            problems.append("растет с N")
+        if max(small[name], large[name]) > budget:
+            problems.append("сверх бюджета")
+        failures += bool(problems)
+        print(f"{name:45} {small[name]:8d} {large[name]:8d} {budget:8d}  {', '.join(problems) or 'ok'}")
+    if failures:
+        print(f"\nнарушений: {failures}")
+        sys.exit(1)
+
+
+asyncio.run(main())
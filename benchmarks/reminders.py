@@ -0,0 +1,77 @@
+"""Пропускная способность отправки напоминаний.
+
+Сравнивает прежний цикл send_reminders (два запроса и commit на каждое
+напоминание, последовательная отправка) с пакетной доставкой из app.scheduler
+через общую очередь отправки app.sender.
+
+    python -m benchmarks.reminders --database-url postgresql://.../bench --count 2000
+"""
+import asyncio
+from datetime import datetime, timedelta
+from benchmarks.common import parse_args, make_bot, reset_schema, report, Timer
+
+args = parse_args(__doc__, count=2000, users=500, latency=0.02, concurrency=20, send_rate=10000.0, chat_interval=0.0)
+
+from sqlalchemy import select, insert
+from app.database import AsyncSessionLocal
+from app.models import User, Meeting, Reminder
+from app.scheduler import deliver_reminders
+from app.sender import send_queue, TokenBucket
+
+# По умолчанию лимиты Telegram сняты, чтобы мерить сам путь доставки; --send-rate 30 покажет потолок API
+send_queue.bucket = TokenBucket(args.send_rate)
+send_queue.chat_interval = args.chat_interval
+
+
+async def seed():
+    await reset_schema()
+    now = datetime.now()
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(User), [
+            {"id": i, "telegram_id": 100000 + i, "first_name": f"user{i}", "role": "guest", "deleted_flag": 0}
+            for i in range(1, args.users + 1)
+        ])
+        await session.execute(insert(Meeting), [
+            {"id": i, "title": f"meeting{i}", "scheduled_at": now + timedelta(minutes=5), "creator_id": 1}
+            for i in range(1, 51)
+        ])
+        await session.execute(insert(Reminder), [
+            {"meeting_id": i % 50 + 1, "user_id": i % args.users + 1, "reminder_time": now - timedelta(seconds=1)}
+            for i in range(args.count)
+        ])
+        await session.commit()
+
+
+async def legacy_delivery(bot):
+    # Тело прежнего цикла send_reminders из run.py
+    session = AsyncSessionLocal()
+    try:
+        reminders = (await session.scalars(select(Reminder).filter(Reminder.reminder_time <= datetime.now()))).all()
+        for reminder in reminders:
+            user = await session.scalar(select(User).filter(User.id == reminder.user_id))
+            meeting = await session.scalar(select(Meeting).filter(Meeting.id == reminder.meeting_id))
+            if user and meeting:
+                await bot.send_message(user.telegram_id, f"Напоминание:\nСовещание '{meeting.title}' начнется через несколько минут.")
+                await session.delete(reminder)
+                await session.commit()
+    finally:
+        await session.close()
+
+
+async def batched_delivery(bot):
+    async with AsyncSessionLocal() as session:
+        reminder_ids = (await session.scalars(select(Reminder.reminder_id))).all()
+    await deliver_reminders(bot, list(reminder_ids), concurrency=args.concurrency)
+
+
+async def main():
+    print(f"напоминаний: {args.count}, задержка Bot API: {args.latency * 1000:.0f} мс")
+    for name, delivery in (("прежний цикл", legacy_delivery), (f"пакетная доставка x{args.concurrency}", batched_delivery)):
+        await seed()
+        bot = make_bot(args.latency)
+        with Timer() as timer:
+            await delivery(bot)
+        report(name, len(bot.session.calls), timer.elapsed)
+
+
+asyncio.run(main())
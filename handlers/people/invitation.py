@@ -1,151 +1,169 @@
-from aiogram import Router, types
+from typing import Optional
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from aiogram.fsm.state import StatesGroup, State
-from app.database import SessionLocal
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User, Meeting, MeetingInvitation
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy import select, literal
+from sqlalchemy.dialects.postgresql import insert
+from app.sender import send_after_commit
+from app.users import UserInfo
+from app.pickers import Picker
+from app.commands import commands
+from handlers.router.meeting import MESSAGE_LIMIT
 import logging
 
 # Инициализация логгера
 logger = logging.getLogger(__name__)
 
-invitation_router = Router()
-
 class InviteStates(StatesGroup):
     select_meeting = State()
     select_user = State()
 
-@invitation_router.message(lambda message: message.text == "Пригласить сотрудника на совещание")
-async def invite_user_callback(message: Message):
-    telegram_id = message.from_user.id
-    session: Session = SessionLocal()
-    try:
-        user = session.query(User).filter(User.telegram_id == telegram_id).first()
-        if user and user.is_meeting_creator:
-            meetings = session.query(Meeting).filter(Meeting.creator_id == user.id).all()
-            if meetings:
-                inline_kb = InlineKeyboardMarkup(inline_keyboard=[])
-                for meeting in meetings:
-                    button = InlineKeyboardButton(text=meeting.title, callback_data=f"select_meeting_{meeting.id}")
-                    inline_kb.inline_keyboard.append([button])
-                await message.answer("Выберите совещание для приглашения:", reply_markup=inline_kb)
-            else:
-                await message.answer("Нет доступных совещаний для приглашения.")
+invite_meeting_picker = Picker(
+    "im", lambda user: select(Meeting.id, Meeting.title).filter(Meeting.creator_id == user.id),
+    action="select_meeting_", key=Meeting.id, order=Meeting.scheduled_at, allowed=lambda user: bool(user.is_meeting_creator)
+)
+invite_user_picker = Picker(
+    "iu", lambda user: select(User.id, User.first_name).filter(User.role != "admin", User.deleted_flag == 0),
+    action="select_user_", key=User.id, selection="invitees", allowed=lambda user: bool(user.is_meeting_creator),
+    footer=[
+        [InlineKeyboardButton(text="Пригласить выбранных", callback_data="invite_selected")],
+        [InlineKeyboardButton(text="Пригласить всех сотрудников", callback_data="invite_everyone")],
+    ]
+)
+
+@commands.message("Пригласить сотрудника на совещание")
+async def invite_user_callback(message: Message, session: AsyncSession, user: UserInfo):
+    if user and user.is_meeting_creator:
+        inline_kb = await invite_meeting_picker.page(session, user)
+        if inline_kb:
+            await message.answer("Выберите совещание для приглашения:", reply_markup=inline_kb)
         else:
-            await message.answer("У вас нет доступа.")
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
-
-@invitation_router.callback_query(lambda c: c.data.startswith("select_meeting_"))
-async def select_meeting_for_invitation(callback: CallbackQuery, state: FSMContext):
+            await message.answer("Нет доступных совещаний для приглашения.")
+    else:
+        await message.answer("У вас нет доступа.")
+
+@commands.callback_query(prefix="select_meeting_")
+async def select_meeting_for_invitation(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: UserInfo):
     meeting_id = int(callback.data.split("_")[2])
-    await state.update_data(meeting_id=meeting_id)
+    await state.update_data(meeting_id=meeting_id, invitees=[])
 
-    session: Session = SessionLocal()
-    try:
-        users = session.query(User).filter(User.role != "admin", User.deleted_flag == 0).all()
-        if users:
-            inline_kb = InlineKeyboardMarkup(inline_keyboard=[])
-            for user in users:
-                button = InlineKeyboardButton(text=user.first_name, callback_data=f"select_user_{user.id}")
-                inline_kb.inline_keyboard.append([button])
-            await callback.message.answer("Выберите пользователя для приглашения:", reply_markup=inline_kb)
-            await state.set_state(InviteStates.select_user)
-        else:
-            await callback.message.answer("Нет доступных пользователей для приглашения.")
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await callback.message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
-
-@invitation_router.callback_query(lambda c: c.data.startswith("select_user_"))
-async def invite_user(callback: CallbackQuery, state: FSMContext):
+    inline_kb = await invite_user_picker.page(session, user)
+    if inline_kb:
+        await callback.message.answer("Выберите сотрудников для приглашения:", reply_markup=inline_kb)
+        await state.set_state(InviteStates.select_user)
+    else:
+        await callback.message.answer("Нет доступных пользователей для приглашения.")
+
+async def own_meeting(session: AsyncSession, user: UserInfo, meeting_id: int) -> Optional[Meeting]:
+    # Приглашать может только создатель совещания, как в команде "Пригласить сотрудника на совещание".
+    # Пока обработчик держит совещание, оно остается в сессии, и invite_users берет его оттуда без второго запроса
+    if not user or not user.is_meeting_creator:
+        return None
+    meeting = await session.get(Meeting, meeting_id)
+    return meeting if meeting is not None and meeting.creator_id == user.id else None
+
+async def invite_users(bot, session: AsyncSession, meeting_id: int, user_ids: list = None) -> list:
+    # Приглашения пишутся одним INSERT ... SELECT: удаленные сотрудники, администраторы и уже приглашенные пропускаются.
+    # Без user_ids приглашаются все сотрудники
+    invitees = select(literal(meeting_id), User.id).filter(User.role != "admin", User.deleted_flag == 0)
+    if user_ids is not None:
+        invitees = invitees.filter(User.id.in_(user_ids))
+    invited = (await session.execute(
+        insert(MeetingInvitation)
+        .from_select(["meeting_id", "user_id"], invitees)
+        .on_conflict_do_nothing(index_elements=[MeetingInvitation.meeting_id, MeetingInvitation.user_id])
+        .returning(MeetingInvitation.id, MeetingInvitation.user_id)
+    )).all()
+    if not invited:
+        return []
+
+    meeting = await session.get(Meeting, meeting_id)
+    users = {row.id: row for row in (await session.execute(
+        select(User.id, User.telegram_id, User.first_name).filter(User.id.in_([user_id for _, user_id in invited]))
+    )).all()}
+    creator = await session.scalar(select(User.telegram_id).filter(User.id == meeting.creator_id))
+
+    # Уведомления уходят в очередь после commit: кнопка "Принять" не может опередить строку приглашения,
+    # а обработчик не ждет рассылки с открытой транзакцией
+    for invitation_id, user_id in invited:
+        send_after_commit(session, bot, users[user_id].telegram_id, f"Вы были приглашены на совещание '{meeting.title}'. Принять приглашение?", reply_markup=InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(text="Принять", callback_data=f"respond_invitation_{invitation_id}_accepted"),
+                    InlineKeyboardButton(text="Отклонить", callback_data=f"respond_invitation_{invitation_id}_declined")
+                ]
+            ]
+        ))
+    if creator:
+        names = ", ".join(users[user_id].first_name or f"#{user_id}" for _, user_id in invited)
+        text = f"Приглашены на совещание '{meeting.title}' ({len(invited)}): {names}"
+        send_after_commit(session, bot, creator, text if len(text) <= MESSAGE_LIMIT else text[:MESSAGE_LIMIT - 1] + "…")
+    return invited
+
+@commands.callback_query(prefix="select_user_")
+async def select_invitee(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: UserInfo):
     user_id = int(callback.data.split("_")[2])
     data = await state.get_data()
     meeting_id = data.get('meeting_id')
+    if not meeting_id:
+        await callback.answer("Сначала выберите совещание.")
+        return
+
+    if callback.message is None:
+        # Кнопка из результата встроенного поиска: приглашение сразу
+        meeting = await own_meeting(session, user, meeting_id)
+        if meeting is None:
+            await callback.answer("У вас нет доступа.")
+            return
+        invited = await invite_users(callback.bot, session, meeting_id, [user_id])
+        await callback.answer("Приглашение отправлено." if invited else "Сотрудник уже приглашен.")
+        return
+
+    # Отметка или снятие отметки; приглашения отправляются кнопкой "Пригласить выбранных"
+    invitees = data.get('invitees', [])
+    marked = user_id not in invitees
+    invitees = invitees + [user_id] if marked else [invitee for invitee in invitees if invitee != user_id]
+    await state.update_data(invitees=invitees)
+    if callback.message.reply_markup:
+        await callback.message.edit_reply_markup(reply_markup=invite_user_picker.toggle(callback.message.reply_markup, user_id, marked))
+    await callback.answer(f"Выбрано: {len(invitees)}")
+
+@commands.callback_query("invite_selected", "invite_everyone")
+async def invite_selected(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: UserInfo):
+    data = await state.get_data()
+    meeting_id = data.get('meeting_id')
+    invitees = data.get('invitees', [])
+    if not meeting_id:
+        await callback.answer("Сначала выберите совещание.")
+        return
+    if callback.data == "invite_selected" and not invitees:
+        await callback.answer("Никто не выбран.")
+        return
+    meeting = await own_meeting(session, user, meeting_id)
+    if meeting is None:
+        await callback.answer("У вас нет доступа.")
+        return
 
-    session = SessionLocal()
     try:
-        invitation = MeetingInvitation(
-            meeting_id=meeting_id,
-            user_id=user_id,
-            accepted=None
-        )
-        session.add(invitation)
-        session.commit()
-
-        user = session.query(User).filter(User.id == user_id).first()
-        meeting = session.query(Meeting).filter(Meeting.id == meeting_id).first() 
-        if user and meeting:
-            # Уведомить пользователя и предложить принять или отклонить приглашение
-            await callback.bot.send_message(user.telegram_id, f"Вы были приглашены на совещание '{meeting.title}'. Принять приглашение?", reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text="Принять", callback_data=f"respond_invitation_{invitation.id}_accepted"),
-                        InlineKeyboardButton(text="Отклонить", callback_data=f"respond_invitation_{invitation.id}_declined")
-                    ]
-                ]
-            ))
-            # Уведомить создателя совещания
-            creator = session.query(User).filter(User.id == meeting.creator_id).first()
-            if creator:
-                await callback.bot.send_message(creator.telegram_id, f"Пользователь {user.first_name} приглашен на совещание '{meeting.title}'.")
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await callback.message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
+        invited = await invite_users(callback.bot, session, meeting_id, invitees if callback.data == "invite_selected" else None)
+        await callback.message.answer(f"Приглашено сотрудников: {len(invited)}." if invited else "Все выбранные сотрудники уже приглашены.")
+    finally:
         await state.clear()
 
-@invitation_router.callback_query(lambda c: c.data.startswith("respond_invitation_"))
-async def respond_to_invitation(callback: CallbackQuery):
-    invitation_id, response = callback.data.split("_")[2], callback.data.split("_")[3]
-    session: Session = SessionLocal()
-    try:
-        invitation = session.query(MeetingInvitation).filter(MeetingInvitation.id == invitation_id).first()
-        if invitation:
-            invitation.accepted = response
-            session.commit()
-            user = session.query(User).filter(User.id == invitation.user_id).first()
-            if user:
-                if response == "accepted":
-                    await callback.bot.send_message(user.telegram_id, f"Ваше приглашение на совещание '{invitation.meeting.title}' было подтверждено.")
-                else:
-                    await callback.bot.send_message(user.telegram_id, f"Ваше приглашение на совещание '{invitation.meeting.title}' было отклонено.")
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await callback.message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
-
-        
\ No newline at end of file
+@commands.callback_query(prefix="respond_invitation_")
+async def respond_to_invitation(callback: CallbackQuery, session: AsyncSession):
+    invitation_id, response = int(callback.data.split("_")[2]), callback.data.split("_")[3]
+
+    invitation = await session.scalar(select(MeetingInvitation).filter(MeetingInvitation.id == invitation_id))
+    if invitation:
+        invitation.accepted = response
+        await session.flush()
+        user = await session.scalar(select(User).filter(User.id == invitation.user_id))
+        meeting = await session.get(Meeting, invitation.meeting_id)
+        if user and meeting:
+            if response == "accepted":
+                send_after_commit(session, callback.bot, user.telegram_id, f"Ваше приглашение на совещание '{meeting.title}' было подтверждено.")
+            else:
+                send_after_commit(session, callback.bot, user.telegram_id, f"Ваше приглашение на совещание '{meeting.title}' было отклонено.")
@@ -1,68 +1,41 @@
-from aiogram import Router, types
-from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from aiogram.types import CallbackQuery, Message
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy import select
+from app.sender import send_after_commit
+from app.users import UserInfo, invalidate_user
+from app.pickers import Picker
+from app.commands import commands
 import logging
 
 # Инициализация логгера
 logger = logging.getLogger(__name__)
 
+restore_guest_picker = Picker(
+    "rg", lambda user: select(User.id, User.first_name).filter(User.role == "guest", User.deleted_flag == 1),
+    action="restore_guest_", key=User.id
+)
 
-restore_router = Router()
-
-@restore_router.message(lambda message: message.text == "Восстановить сотрудника")
-async def show_deleted_guests(message: Message):
-    session: Session = SessionLocal()
-    try:
-        deleted_guests = session.query(User).filter(User.role == "guest", User.deleted_flag == 1).all()
-        if not deleted_guests:
-            await message.answer("Нет удаленных пользователей.")
-            return
-        
-        inline_kb = InlineKeyboardMarkup(inline_keyboard=[])
-        for guest in deleted_guests:
-            button = InlineKeyboardButton(text=f"{guest.first_name}", callback_data=f"restore_guest_{guest.id}")
-            inline_kb.inline_keyboard.append([button])
-        
-        await message.answer("Список удаленных пользователей:", reply_markup=inline_kb)
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
+@commands.message("Восстановить сотрудника")
+async def show_deleted_guests(message: Message, session: AsyncSession, user: UserInfo):
+    inline_kb = await restore_guest_picker.page(session, user)
+    if not inline_kb:
+        await message.answer("Нет удаленных пользователей.")
+        return
+    
+    await message.answer("Список удаленных пользователей:", reply_markup=inline_kb)
 
-@restore_router.callback_query(lambda c: c.data.startswith("restore_guest_"))
-async def restore_guest(callback: CallbackQuery):
+@commands.callback_query(prefix="restore_guest_")
+async def restore_guest(callback: CallbackQuery, session: AsyncSession):
     user_id = int(callback.data.split("_")[2])
     
-    session: Session = SessionLocal()
-    try:
-        user = session.query(User).filter(User.id == user_id, User.role == "guest", User.deleted_flag == 1).first()
-        if user:
-            user.deleted_flag = 0
-            session.commit()
-            await callback.message.answer(f"Пользователь {user.first_name} был восстановлен.")
+    user = await session.scalar(select(User).filter(User.id == user_id, User.role == "guest", User.deleted_flag == 1))
+    if user:
+        user.deleted_flag = 0
+        await session.flush()
+        invalidate_user(session, user.telegram_id)
+        await callback.message.answer(f"Пользователь {user.first_name} был восстановлен.")
 
-            await callback.bot.send_message(user.telegram_id, "Вы были восстановлены.")
-        else:
-            await callback.message.answer("Пользователь не найден или уже восстановлен.")
-    except IntegrityError as e: 
-        logger.error(f"IntegrityError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка целостности данных. Попробуйте позже.") 
-    except SQLAlchemyError as e: 
-        logger.error(f"SQLAlchemyError: {str(e)}") 
-        await callback.message.answer("Произошла ошибка базы данных. Попробуйте позже.") 
-    except Exception as e: 
-        logger.error(f"Unexpected error: {str(e)}") 
-        await callback.message.answer(f"Произошла ошибка: {str(e)}") 
-    finally: 
-        session.close()
\ No newline at end of file
+        send_after_commit(session, callback.bot, user.telegram_id, "Вы были восстановлены.")
+    else:
+        await callback.message.answer("Пользователь не найден или уже восстановлен.")
\ No newline at end of file
@@ -4,10 +4,17 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from datetime import datetime
 from typing import Union
-from app.models import User, Meeting, Reminder,  MeetingNote, MeetingInvitation
-from app.database import SessionLocal
+from app.models import User, Meeting, MeetingInvitation
 import app.keyboards as kb
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from app.database import on_commit
+from app.users import UserInfo, invalidate_user
+from app.pickers import Picker
+from app.views import meeting_views, view_scope
+from app.scheduler import reminder_scheduler
+from app.commands import commands
+from sqlalchemy import select, tuple_, literal
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
 # Инициализация логгера
@@ -23,47 +30,37 @@ class MeetingStates(StatesGroup):
 class DeleteMeetingStates(StatesGroup):
     choose_meeting = State()
 
-@meeting_router.callback_query(lambda c: c.data == "meeting_management")
+delete_meeting_picker = Picker(
+    "dm", lambda user: select(Meeting.id, Meeting.title).filter(Meeting.creator_id == user.id),
+    action="delete_meeting_", key=Meeting.id, order=Meeting.scheduled_at, allowed=lambda user: user.role == "admin"
+)
+
+@commands.callback_query("meeting_management")
 async def meeting_management(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("Выберите действие для управления совещаниями:", reply_markup=kb.next_admin_keyboard())
 
-@meeting_router.message(lambda message: message.text == "Создать совещание")
-async def create_meeting(message: Message, state: FSMContext):
-    session = SessionLocal()
-    telegram_id = message.from_user.id
-
-    try:
-        user = session.query(User).filter(User.telegram_id == telegram_id).first()
-        if user and user.role == 'admin':
-            await message.answer("Введите название совещания:")
-            await state.set_state(MeetingStates.title)
-        else:
-            await message.answer("У вас нет прав для создания совещаний.")
-    except IntegrityError as e:
-        logger.error(f"IntegrityError: {str(e)}")
-        await message.answer("Произошла ошибка целостности данных. Попробуйте позже.")
-    except SQLAlchemyError as e:
-        logger.error(f"SQLAlchemyError: {str(e)}")
-        await message.answer("Произошла ошибка базы данных. Попробуйте позже.")
-    except Exception as e:
-        await message.answer(f"Ошибка при проверке пользователя: {str(e)}")
-    finally:
-        session.close()
+@commands.message("Создать совещание")
+async def create_meeting(message: Message, state: FSMContext, user: UserInfo):
+    if user and user.role == 'admin':
+        await state.set_state(MeetingStates.title)
+        await message.answer("Введите название совещания:")
+    else:
+        await message.answer("У вас нет прав для создания совещаний.")
 
 @meeting_router.message(MeetingStates.title)
 async def process_meeting_title(message: Message, state: FSMContext):
     await state.update_data(meeting_title=message.text)
-    await message.answer("Введите описание совещания:")
     await state.set_state(MeetingStates.description)
+    await message.answer("Введите описание совещания:")
 
 @meeting_router.message(MeetingStates.description)
 async def process_meeting_description(message: Message, state: FSMContext):
     await state.update_data(meeting_description=message.text)
-    await message.answer("Введите дату и время проведения совещания (в формате ГГГГ-ММ-ДД ЧЧ:ММ):")
     await state.set_state(MeetingStates.scheduled_at)
+    await message.answer("Введите дату и время проведения совещания (в формате ГГГГ-ММ-ДД ЧЧ:ММ):")
 
 @meeting_router.message(MeetingStates.scheduled_at)
-async def process_meeting_scheduled_at(message: Message, state: FSMContext):
+async def process_meeting_scheduled_at(message: Message, state: FSMContext, session: AsyncSession):
     scheduled_at_str = message.text
     data = await state.get_data()
     meeting_title = data['meeting_title']
@@ -71,182 +68,170 @@ async def process_meeting_scheduled_at(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
     created_by = datetime.now()
 
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter(User.telegram_id == telegram_id).first()
-        if not user:
-            await message.answer("Пользователь не найден.")
-            return
-
-        try:
-            scheduled_at = datetime.strptime(scheduled_at_str, "%Y-%m-%d %H:%M")
-        except ValueError as ve:
-            await message.answer("Некорректный формат даты. Пожалуйста, используйте формат ГГГГ-ММ-ДД ЧЧ:ММ.")
-            return
-
-        new_meeting = Meeting(
-            title=meeting_title,
-            description=meeting_description,
-            created_by=created_by,
-            scheduled_at=scheduled_at,
-            creator_id=user.id
-        )
-        session.add(new_meeting)
-        session.commit()
-
-        user.is_meeting_creator = 1
-        session.commit()
-
-        await message.answer("Совещание успешно создано.")
-        await state.clear()
-    except IntegrityError as e:
-        logger.error(f"IntegrityError: {str(e)}")
-        await message.answer("Произошла ошибка целостности данных. Попробуйте позже.")
-    except SQLAlchemyError as e:
-        logger.error(f"SQLAlchemyError: {str(e)}")
-        await message.answer("Произошла ошибка базы данных. Попробуйте позже.")
-    except Exception as e:
-        session.rollback()
-        await message.answer(f"Ошибка при создании совещания: {str(e)}")
-    finally:
-        session.close()
-
-@meeting_router.message(lambda message: message.text == "Удалить совещание")
-async def delete_meeting(message: Message, state: FSMContext):
-    session = SessionLocal()
-    telegram_id = message.from_user.id
+    user = await session.scalar(select(User).filter(User.telegram_id == telegram_id))
+    if not user:
+        await message.answer("Пользователь не найден.")
+        return
 
     try:
-        user = session.query(User).filter(User.telegram_id == telegram_id).first()
-        if user and user.role == 'admin':
-            meetings = session.query(Meeting).filter(Meeting.creator_id == user.id).all()
-            if meetings:
-                inline_kb = InlineKeyboardMarkup(inline_keyboard=[])
-                for meeting in meetings:
-                    button = InlineKeyboardButton(text=meeting.title, callback_data=f"delete_meeting_{meeting.id}")
-                    inline_kb.inline_keyboard.append([button])
-                await message.answer("Выберите совещание, которое хотите удалить:", reply_markup=inline_kb)
-                await state.set_state(DeleteMeetingStates.choose_meeting)
-            else:
-                await message.answer("У вас нет созданных совещаний.")
+        scheduled_at = datetime.strptime(scheduled_at_str, "%Y-%m-%d %H:%M")
+    except ValueError as ve:
+        await message.answer("Некорректный формат даты. Пожалуйста, используйте формат ГГГГ-ММ-ДД ЧЧ:ММ.")
+        return
+
+    new_meeting = Meeting(
+        title=meeting_title,
+        description=meeting_description,
+        created_by=created_by,
+        scheduled_at=scheduled_at,
+        creator_id=user.id
+    )
+    session.add(new_meeting)
+    user.is_meeting_creator = 1
+    invalidate_user(session, telegram_id)
+    # Совещание и флаг создателя записываются одним flush, commit выполнит middleware
+    await session.flush()
+
+    await message.answer("Совещание успешно создано.")
+    await state.clear()
+
+@commands.message("Удалить совещание")
+async def delete_meeting(message: Message, state: FSMContext, session: AsyncSession, user: UserInfo):
+    if user and user.role == 'admin':
+        inline_kb = await delete_meeting_picker.page(session, user)
+        if inline_kb:
+            await message.answer("Выберите совещание, которое хотите удалить:", reply_markup=inline_kb)
+            await state.set_state(DeleteMeetingStates.choose_meeting)
         else:
-            await message.answer("У вас нет прав для удаления совещаний.")
-    finally:
-        session.close()
+            await message.answer("У вас нет созданных совещаний.")
+    else:
+        await message.answer("У вас нет прав для удаления совещаний.")
 
-@meeting_router.callback_query(lambda c: c.data.startswith("delete_meeting_"))
-async def process_delete_meeting(callback: CallbackQuery, state: FSMContext):
+@commands.callback_query(prefix="delete_meeting_")
+async def process_delete_meeting(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     meeting_id = int(callback.data.split("_")[2])
 
-    session = SessionLocal()
     try:
-        meeting = session.query(Meeting).filter(Meeting.id == meeting_id).first()
+        meeting = await session.get(Meeting, meeting_id)
         if meeting:
-            session.delete(meeting)
-            session.commit()
+            await session.delete(meeting)
+            await session.flush()
+            on_commit(session, lambda: reminder_scheduler.discard_meeting(meeting_id))
             await callback.message.answer("Совещание успешно удалено.")
         else:
             await callback.message.answer("Совещание не найдено.")
-    except IntegrityError as e:
-        logger.error(f"IntegrityError: {str(e)}")
-        await callback.message.answer("Произошла ошибка целостности данных. Попробуйте позже.")
-    except SQLAlchemyError as e:
-        logger.error(f"SQLAlchemyError: {str(e)}")
-        await callback.message.answer("Произошла ошибка базы данных. Попробуйте позже.")
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        await callback.message.answer(f"Ошибка при удалении совещания: {str(e)}")
     finally:
         await state.clear()
-        session.close()
-
-@meeting_router.callback_query(lambda c: c.data == "list_meeting")
-@meeting_router.message(lambda message: message.text == "Просмотреть совещания")
-async def list_meetings(event: Union[Message, CallbackQuery]):
-    session = SessionLocal()
-    try:
-        now = datetime.now()
-        user_id = event.from_user.id if isinstance(event, Message) else event.message.chat.id
-        
-        # Найти пользователя по Telegram ID
-        user = session.query(User).filter(User.telegram_id == user_id).first()
-        if not user:
-            response = "Пользователь не найден."
-            if isinstance(event, Message):
-                await event.answer(response)
-            else:
-                await event.message.answer(response)
-            return
-
-        if user.role == "admin":
-            meetings = session.query(Meeting).order_by(Meeting.scheduled_at).all()
-        else:
-            # Получить все совещания, на которые пользователь был приглашен и принял приглашение
-            meetings = session.query(Meeting).join(MeetingInvitation).filter(
-                MeetingInvitation.user_id == user.id,
-                MeetingInvitation.accepted == "accepted"
-            ).order_by(Meeting.scheduled_at).all()
-
-        if meetings:
-            response = "Список совещаний:\n"
-            for meeting in meetings:
-                #if meeting.scheduled_at < now:
-                    # Удаление прошедших совещаний и связанных данных
-                    #session.query(MeetingNote).filter(MeetingNote.meeting_id == meeting.id).delete()
-                    #session.query(Reminder).filter(Reminder.meeting_id == meeting.id).delete()
-                    #session.query(MeetingInvitation).filter(MeetingInvitation.meeting_id == meeting.id).delete()
-                    #session.delete(meeting)
-                    #session.commit()
-                    #continue
-
-                scheduled_at = meeting.scheduled_at.strftime("%Y-%m-%d %H:%M")
-                response += f"Название: {meeting.title}\nОписание: {meeting.description}\nДата и время: {scheduled_at}\n"
-
-                notes = session.query(MeetingNote).filter(MeetingNote.meeting_id == meeting.id).all()
-                if notes:
-                    response += "Заметки:\n"
-                    for note in notes:
-                        response += f"- {note.note}\n"
-                
-                reminders = session.query(Reminder).filter(Reminder.meeting_id == meeting.id).all()
-                if reminders:
-                    response += "Напоминания:\n"
-                    for reminder in reminders:
-                        reminder_time = reminder.reminder_time.strftime("%Y-%m-%d %H:%M")
-                        response += f"- {reminder_time}\n"
-                
-                response += "\n"
-        else:
-            response = "Совещания не найдены."
 
-        if isinstance(event, Message):
-            await event.answer(response)
-        else:
-            await event.message.answer(response)
-    except IntegrityError as e:
-        logger.error(f"IntegrityError: {str(e)}")
-        await event.answer("Произошла ошибка целостности данных. Попробуйте позже.")
-    except SQLAlchemyError as e:
-        logger.error(f"SQLAlchemyError: {str(e)}")
-        await event.answer("Произошла ошибка базы данных. Попробуйте позже.")
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        await event.answer(f"Ошибка при получении списка совещаний: {str(e)}")
-    finally:
-        session.close()
+# Совещаний на одной странице списка и лимит Telegram на длину сообщения
+MEETINGS_PAGE_SIZE = 5
+MESSAGE_LIMIT = 4096
+CURSOR_FORMAT = "%Y%m%d%H%M%S"
+
+def render_meeting(meeting: Meeting) -> str:
+    scheduled_at = meeting.scheduled_at.strftime("%Y-%m-%d %H:%M")
+    text = f"Название: {meeting.title}\nОписание: {meeting.description}\nДата и время: {scheduled_at}\n"
+    if meeting.meeting_notes:
+        text += "Заметки:\n" + "".join(f"- {note.note}\n" for note in meeting.meeting_notes)
+    if meeting.reminders:
+        text += "Напоминания:\n" + "".join(f"- {reminder.reminder_time.strftime('%Y-%m-%d %H:%M')}\n" for reminder in meeting.reminders)
+    # Одно совещание не должно занять больше страницы
+    if len(text) > MESSAGE_LIMIT // 2:
+        text = text[:MESSAGE_LIMIT // 2 - 1] + "…\n"
+    return text + "\n"
+
+def meeting_cursor(meeting: Meeting) -> str:
+    return f"{meeting.scheduled_at.strftime(CURSOR_FORMAT)}_{meeting.id}"
+
+async def render_meetings_page(session: AsyncSession, user: UserInfo, direction: str = "next", cursor: str = None):
+    # Повторный просмотр той же страницы берется из кэша без запросов к БД (app/views.py)
+    scope = view_scope(user)
+    view = meeting_views.get(scope, direction, cursor)
+    if view is None:
+        view = await build_meetings_page(session, user, direction, cursor)
+        meeting_views.put(scope, direction, cursor, view)
+    return view
+
+async def build_meetings_page(session: AsyncSession, user: UserInfo, direction: str, cursor: str):
+    # Заметки и напоминания подгружаются двумя запросами на всю страницу (selectinload), а не на каждое совещание
+    query = select(Meeting).options(selectinload(Meeting.meeting_notes), selectinload(Meeting.reminders))
+    if user.role != "admin":
+        # Совещания, на которые пользователь был приглашен и принял приглашение
+        query = query.join(MeetingInvitation).filter(
+            MeetingInvitation.user_id == user.id,
+            MeetingInvitation.accepted == "accepted"
+        )
 
-@meeting_router.message(lambda message: message.text == "🔙 Назад")
-async def go_back(message: Message):
-    telegram_id = message.from_user.id
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter(User.telegram_id == telegram_id).first()
-        if user and user.role == 'admin':
-            await message.answer("Выберите действие:", reply_markup=kb.admin_keyboard())
-        else:
-            await message.answer("Выберите действие:", reply_markup=kb.guest_keyboard())
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        await message.answer(f"Ошибка при обработке запроса: {str(e)}")
-    finally:
-        session.close()
+    # Keyset-пагинация по (scheduled_at, id): стоимость страницы не зависит от ее номера
+    key = tuple_(Meeting.scheduled_at, Meeting.id)
+    if cursor:
+        scheduled_at, meeting_id = cursor.split("_")
+        position = tuple_(literal(datetime.strptime(scheduled_at, CURSOR_FORMAT)), literal(int(meeting_id)))
+        query = query.filter(key > position if direction == "next" else key < position)
+    if direction == "next":
+        query = query.order_by(Meeting.scheduled_at, Meeting.id)
+    else:
+        query = query.order_by(Meeting.scheduled_at.desc(), Meeting.id.desc())
+    meetings = (await session.scalars(query.limit(MEETINGS_PAGE_SIZE + 1))).all()
+
+    has_more = len(meetings) > MEETINGS_PAGE_SIZE
+    meetings = meetings[:MEETINGS_PAGE_SIZE]
+
+    # Берем столько совещаний, сколько помещается в одно сообщение
+    header = "Список совещаний:\n"
+    page, length = [], len(header)
+    for meeting in meetings:
+        block = render_meeting(meeting)
+        if page and length + len(block) > MESSAGE_LIMIT:
+            has_more = True
+            break
+        page.append((meeting, block))
+        length += len(block)
+
+    if direction == "prev":
+        page.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = cursor is not None, has_more
+
+    if not page:
+        return "Совещания не найдены.", None
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="◀ Назад", callback_data=f"meetings_prev_{meeting_cursor(page[0][0])}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Далее ▶", callback_data=f"meetings_next_{meeting_cursor(page[-1][0])}"))
+    markup = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return header + "".join(block for _, block in page), markup
+
+@commands.callback_query("list_meeting")
+@commands.message("Просмотреть совещания")
+async def list_meetings(event: Union[Message, CallbackQuery], session: AsyncSession, user: UserInfo):
+    answer = event.answer if isinstance(event, Message) else event.message.answer
+
+    if not user:
+        await answer("Пользователь не найден.")
+        return
+
+    response, markup = await render_meetings_page(session, user)
+    await answer(response, reply_markup=markup)
+
+@commands.callback_query(prefix=("meetings_next_", "meetings_prev_"))
+async def list_meetings_page(callback: CallbackQuery, session: AsyncSession, user: UserInfo):
+    _, direction, cursor = callback.data.split("_", 2)
+
+    if not user:
+        await callback.answer("Пользователь не найден.")
+        return
+
+    response, markup = await render_meetings_page(session, user, direction, cursor)
+    await callback.message.edit_text(response, reply_markup=markup)
+    await callback.answer()
+
+@commands.message("🔙 Назад")
+async def go_back(message: Message, user: UserInfo):
+    if user and user.role == 'admin':
+        await message.answer("Выберите действие:", reply_markup=kb.admin_keyboard())
+    else:
+        await message.answer("Выберите действие:", reply_markup=kb.guest_keyboard())
@@ -0,0 +1,24 @@
+from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.pickers import PickerPage, pickers
+from app.users import UserInfo
+from app.commands import commands
+import logging
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+@commands.callback_query(prefix=PickerPage)
+async def turn_picker_page(callback: CallbackQuery, callback_data: PickerPage, state: FSMContext, session: AsyncSession, user: UserInfo):
+    picker = pickers.get(callback_data.name)
+    if not user or (picker and not picker.allowed(user)):
+        await callback.answer("У вас нет доступа.")
+        return
+    selected = set((await state.get_data()).get(picker.selection, [])) if picker and picker.selection else ()
+    markup = await picker.page(session, user, callback_data.cursor, bool(callback_data.back), selected) if picker else None
+    if markup:
+        await callback.message.edit_reply_markup(reply_markup=markup)
+        await callback.answer()
+    else:
+        await callback.answer("Список изменился, откройте его заново.")
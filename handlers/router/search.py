@@ -0,0 +1,134 @@
+from aiogram import Router
+from aiogram.types import (
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent, InlineKeyboardMarkup, InlineKeyboardButton
+)
+from sqlalchemy import select, func, or_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import SEARCH_LIMIT, SEARCH_CACHE_TTL
+from app.models import User, Meeting, MeetingInvitation
+from app.users import UserInfo
+from app.cache import TTLCache
+import logging
+
+# Инициализация логгера
+logger = logging.getLogger(__name__)
+
+search_router = Router()
+
+# Сколько разных запросов держать в кэше
+SEARCH_CACHE_SIZE = 1000
+
+class SearchCache(TTLCache):
+    """Результаты поиска по (область видимости, запрос) на SEARCH_CACHE_TTL секунд.
+
+    Если результат для начала запроса был полным (меньше лимита), результат для
+    продолжения - его подмножество и отбирается в памяти без запроса к БД.
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, maxsize: int = SEARCH_CACHE_SIZE):
+        super().__init__(maxsize, ttl)
+
+    def get(self, scope: str, query: str):
+        for length in range(len(query), 0, -1):
+            entry = self.peek((scope, query[:length]))
+            if entry is None:
+                continue
+            rows, complete = entry
+            if length == len(query):
+                self.hits += 1
+                return rows
+            if complete:
+                self.hits += 1
+                return sorted((row for row in rows if matches(row, query)), key=lambda row: rank(row, query))
+        self.misses += 1
+        return None
+
+    def put(self, scope: str, query: str, rows: list, complete: bool):
+        self.store((scope, query), (rows, complete))
+
+search_cache = SearchCache()
+
+def matches(row, query: str) -> bool:
+    # То же условие, что contains() в SQL: у сотрудника имя или username, у совещания название
+    values = row[2:4] if row[0] == "user" else row[2:3]
+    return any(query in (value or "").lower() for value in values)
+
+def rank(row, query: str):
+    # Тот же порядок, что ranked() в SQL, внутри каждого вида результатов
+    text = (row[2] or "").lower()
+    return row[0] != "user", not text.startswith(query), len(text), row[1]
+
+def escape_like(query: str) -> str:
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def contains(column, query: str):
+    # ILIKE '%запрос%'; ускоряется триграммным индексом (migrations/0007_trigram_search.sql)
+    return column.ilike(f"%{escape_like(query)}%", escape="\\")
+
+def ranked(column, query: str):
+    # Сначала совпадения с начала строки, затем более короткие строки
+    value = func.coalesce(column, "")
+    return case((value.ilike(f"{escape_like(query)}%", escape="\\"), 0), else_=1), func.length(value)
+
+async def search(session: AsyncSession, user: UserInfo, query: str):
+    # Строки ("user", id, first_name, username) и ("meeting", id, title, scheduled_at) и признак полноты результата
+    rows = []
+    complete = True
+    if user.role == "admin":
+        users = (await session.execute(
+            select(User.id, User.first_name, User.username)
+            .filter(User.role != "admin", User.deleted_flag == 0, or_(contains(User.first_name, query), contains(User.username, query)))
+            .order_by(*ranked(User.first_name, query), User.id)
+            .limit(SEARCH_LIMIT)
+        )).all()
+        rows += [("user", user_id, first_name, username) for user_id, first_name, username in users]
+        complete = complete and len(users) < SEARCH_LIMIT
+
+    meetings_query = select(Meeting.id, Meeting.title, Meeting.scheduled_at).filter(contains(Meeting.title, query))
+    if user.role != "admin":
+        meetings_query = meetings_query.join(MeetingInvitation).filter(
+            MeetingInvitation.user_id == user.id,
+            MeetingInvitation.accepted == "accepted"
+        )
+    meetings = (await session.execute(meetings_query.order_by(*ranked(Meeting.title, query), Meeting.id).limit(SEARCH_LIMIT))).all()
+    rows += [("meeting", meeting_id, title, scheduled_at) for meeting_id, title, scheduled_at in meetings]
+    complete = complete and len(meetings) < SEARCH_LIMIT
+    return rows, complete
+
+def render_result(row) -> InlineQueryResultArticle:
+    kind, row_id, text, extra = row
+    if kind == "user":
+        username = f"@{extra}" if extra else ""
+        return InlineQueryResultArticle(
+            id=f"user_{row_id}",
+            title=text or f"#{row_id}",
+            description=username or None,
+            input_message_content=InputTextMessageContent(message_text=f"Сотрудник: {text} {username}".strip()),
+            # Приглашение на совещание, выбранное в "Пригласить сотрудника на совещание"
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="Пригласить", callback_data=f"select_user_{row_id}")]
+            ]),
+        )
+    scheduled_at = extra.strftime("%Y-%m-%d %H:%M") if extra else ""
+    return InlineQueryResultArticle(
+        id=f"meeting_{row_id}",
+        title=text or f"#{row_id}",
+        description=scheduled_at,
+        input_message_content=InputTextMessageContent(message_text=f"Совещание: {text}\nДата и время: {scheduled_at}"),
+    )
+
+@search_router.inline_query()
+async def inline_search(inline_query: InlineQuery, session: AsyncSession, user: UserInfo):
+    query = inline_query.query.strip().lower()
+    if not user or user.deleted_flag or not query:
+        await inline_query.answer([], cache_time=5, is_personal=True)
+        return
+
+    # Администраторы видят один и тот же справочник, сотрудник - только свои совещания
+    scope = "admin" if user.role == "admin" else f"guest:{user.id}"
+    rows = search_cache.get(scope, query)
+    if rows is None:
+        rows, complete = await search(session, user, query)
+        search_cache.put(scope, query, rows, complete)
+
+    await inline_query.answer([render_result(row) for row in rows], cache_time=5, is_personal=True)
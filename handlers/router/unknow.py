@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
@@ -9,11 +10,15 @@ class UnknowStates(StatesGroup):
     unknown = State()
 
 @unknow_router.message()
-async def handle_unknown_command(message: Message, state: FSMContext):
+async def handle_unknown_command(message: Message, state: FSMContext, raw_state: Optional[str]):
     await message.answer(f"Извините, я вас не понял. Выберите команду из меню бота.")
-    await state.set_state(UnknowStates.unknown)
+    # Незавершенный диалог сбрасывается, а не сохраняется в хранилище FSM; без диалога писать нечего
+    if raw_state is not None:
+        await state.clear()
 
 @unknow_router.message()
-async def handle_unknown_message(message: Message, state: FSMContext):
+async def handle_unknown_message(message: Message, state: FSMContext, raw_state: Optional[str]):
     await message.answer(f"Извините, я вас не понял. Выберите команду из меню бота.")
-    await state.set_state(UnknowStates.unknown)
+    # Незавершенный диалог сбрасывается, а не сохраняется в хранилище FSM; без диалога писать нечего
+    if raw_state is not None:
+        await state.clear()
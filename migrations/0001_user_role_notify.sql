@@ -0,0 +1,19 @@
+-- Мгновенное уведомление бота о смене роли вместо опроса таблицы Users.
+-- Смена уже выбранной роли сама выставляет role_changed = 1; любая запись role_changed = 1
+-- отправляет NOTIFY в канал user_role_changed с id пользователя (доставляется после commit).
+CREATE OR REPLACE FUNCTION notify_user_role_changed() RETURNS trigger AS $$
+BEGIN
+    IF OLD.role IS NOT NULL AND NEW.role IS DISTINCT FROM OLD.role THEN
+        NEW.role_changed := 1;
+    END IF;
+    IF NEW.role_changed = 1 THEN
+        PERFORM pg_notify('user_role_changed', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_role_changed ON "Users";
+CREATE TRIGGER users_role_changed
+    BEFORE UPDATE OF role, role_changed ON "Users"
+    FOR EACH ROW EXECUTE FUNCTION notify_user_role_changed();
@@ -0,0 +1,21 @@
+-- Индексы под фильтры обработчиков и фоновых задач (те же индексы объявлены в app/models.py).
+-- Приглашения: совещания пользователя и участники совещания, только принятые.
+CREATE INDEX IF NOT EXISTS "ix_MeetingInvitations_user_id_accepted" ON "MeetingInvitations" (user_id, accepted);
+CREATE INDEX IF NOT EXISTS "ix_MeetingInvitations_meeting_id_accepted" ON "MeetingInvitations" (meeting_id, accepted);
+
+-- Совещания: список по дате с keyset-пагинацией по (scheduled_at, id) и совещания создателя.
+CREATE INDEX IF NOT EXISTS "ix_Meetings_scheduled_at_id" ON "Meetings" (scheduled_at, id);
+CREATE INDEX IF NOT EXISTS "ix_Meetings_creator_id" ON "Meetings" (creator_id);
+
+-- Напоминания: выборка наступивших и удаление вместе с совещанием.
+CREATE INDEX IF NOT EXISTS "ix_reminders_reminder_time" ON reminders (reminder_time);
+CREATE INDEX IF NOT EXISTS "ix_reminders_meeting_id" ON reminders (meeting_id);
+
+-- Заметки совещания.
+CREATE INDEX IF NOT EXISTS "ix_meeting_notes_meeting_id" ON meeting_notes (meeting_id);
+
+-- Неотвеченные вопросы: частичный индекс остается маленьким, сколько бы ответов ни накопилось.
+CREATE INDEX IF NOT EXISTS "ix_feedback_unanswered" ON feedback (id) WHERE answered = 0;
+
+-- Пользователи по роли: администраторы для рассылки, активные и удаленные сотрудники для списков.
+CREATE INDEX IF NOT EXISTS "ix_Users_role_deleted_flag" ON "Users" (role, deleted_flag);
@@ -0,0 +1,7 @@
+-- Состояния FSM aiogram (app/storage.py): диалоги переживают перезапуск и общие для нескольких процессов бота.
+CREATE TABLE IF NOT EXISTS fsm_storage (
+    key VARCHAR PRIMARY KEY,
+    state VARCHAR,
+    data JSON NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
@@ -0,0 +1,2 @@
+-- Очистка брошенных диалогов FSM по времени последнего изменения (PostgresStorage.sweep).
+CREATE INDEX IF NOT EXISTS ix_fsm_storage_updated_at ON fsm_storage (updated_at);
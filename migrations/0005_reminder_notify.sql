@@ -0,0 +1,13 @@
+-- Новое или перенесенное напоминание сразу попадает в планировщик ведущего экземпляра бота,
+-- даже если создано в другом экземпляре: NOTIFY reminder_changed с "reminder_id,meeting_id,reminder_time".
+CREATE OR REPLACE FUNCTION notify_reminder_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('reminder_changed', NEW.reminder_id || ',' || NEW.meeting_id || ',' || to_char(NEW.reminder_time, 'YYYY-MM-DD"T"HH24:MI:SS'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reminders_changed ON reminders;
+CREATE TRIGGER reminders_changed
+    AFTER INSERT OR UPDATE OF reminder_time ON reminders
+    FOR EACH ROW EXECUTE FUNCTION notify_reminder_changed();
@@ -0,0 +1,5 @@
+-- Архив удаленных прошедших совещаний (app/purge.py при PURGE_ARCHIVE=1): те же столбцы без ключей, индексов и значений по умолчанию.
+CREATE TABLE IF NOT EXISTS "Meetings_archive" (LIKE "Meetings");
+CREATE TABLE IF NOT EXISTS "MeetingInvitations_archive" (LIKE "MeetingInvitations");
+CREATE TABLE IF NOT EXISTS reminders_archive (LIKE reminders);
+CREATE TABLE IF NOT EXISTS meeting_notes_archive (LIKE meeting_notes);
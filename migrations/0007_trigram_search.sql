@@ -0,0 +1,15 @@
+-- Триграммные GIN-индексы для inline-поиска (handlers/router/search.py): ILIKE '%запрос%' без полного просмотра таблиц.
+-- Если расширение pg_trgm недоступно на сервере, поиск работает и без индексов.
+DO $$
+BEGIN
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE WARNING 'pg_trgm недоступно, триграммные индексы не созданы: %', SQLERRM;
+        RETURN;
+    END;
+    EXECUTE 'CREATE INDEX IF NOT EXISTS "ix_Users_first_name_trgm" ON "Users" USING gin (first_name gin_trgm_ops)';
+    EXECUTE 'CREATE INDEX IF NOT EXISTS "ix_Users_username_trgm" ON "Users" USING gin (username gin_trgm_ops)';
+    EXECUTE 'CREATE INDEX IF NOT EXISTS "ix_Meetings_title_trgm" ON "Meetings" USING gin (title gin_trgm_ops)';
+END;
+$$;
@@ -0,0 +1,10 @@
+-- Одно приглашение на пару (совещание, сотрудник): массовое приглашение пишет INSERT ... ON CONFLICT DO NOTHING.
+-- Из уже записанных дублей остается приглашение с ответом, а среди равных - самое позднее.
+DELETE FROM "MeetingInvitations" WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (PARTITION BY meeting_id, user_id ORDER BY accepted IS NULL, id DESC) AS position
+        FROM "MeetingInvitations"
+    ) ranked
+    WHERE position > 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS "uq_MeetingInvitations_meeting_id_user_id" ON "MeetingInvitations" (meeting_id, user_id);
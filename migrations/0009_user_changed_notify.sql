@@ -0,0 +1,14 @@
+-- Сброс кэша пользователей (app.users.user_cache) во всех экземплярах бота.
+-- Изменение полей, которые попадают в кэш, или удаление строки Users отправляет NOTIFY
+-- в канал user_changed с telegram_id пользователя (доставляется после commit).
+CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('user_changed', OLD.telegram_id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_changed ON "Users";
+CREATE TRIGGER users_changed
+    AFTER UPDATE OF telegram_id, username, first_name, role, deleted_flag, is_meeting_creator OR DELETE ON "Users"
+    FOR EACH ROW EXECUTE FUNCTION notify_user_changed();
@@ -1,57 +1,31 @@
 import logging
 import os
 import asyncio
-from datetime import datetime
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import CallbackQuery
-from handlers.router.users import user_router
-from handlers.router.meeting import meeting_router
-from handlers.router.reminders import reminder_router
-from handlers.router.note import note_router
-from handlers.router.feedback import guest_router, admin_router
-from handlers.people.participants import participants_router
-from handlers.people.invitation import invitation_router
-from handlers.people.restore import restore_router
-from handlers.router.unknow import unknow_router
+from app.dispatcher import build_dispatcher
+from app.migrations import apply_migrations
+from app.roles import listen_role_changes, reconcile_role_changes
+from app.scheduler import reminder_scheduler
+from app.sender import send_queue
+from app.storage import PostgresStorage
+from app.config import BOT_MODE, TELEGRAM_API_URL, METRICS_PORT
+from app.webhook import run_webhook
+from app.leader import run_as_leader
+from app.purge import run_purge
+from app.logs import setup_logging
+from app.metrics import ApiMetricsMiddleware, register_collector, run_metrics_server
+from app.middlewares import FsmFlushMiddleware
+from app.database import get_pool_stats, fsm_engine
+from app.users import user_cache
+from app.views import meeting_views
+from handlers.router.search import search_cache
 
-import app.keyboards as kb
-from app.database import SessionLocal
-from app.models import Reminder, User, Meeting
-
-# Создание папки для логов, если она не существует
-log_directory = 'logs'
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
-
-# Настройка обработчиков логов
-info_log_file_path = os.path.join(log_directory, 'info.log')
-error_log_file_path = os.path.join(log_directory, 'error.log')
-
-# Обработчик для информационных сообщений
-info_handler = logging.FileHandler(info_log_file_path)
-info_handler.setLevel(logging.INFO)
-info_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-info_handler.setFormatter(info_formatter)
-
-# Обработчик для ошибок и критических сообщений
-error_handler = logging.FileHandler(error_log_file_path)
-error_handler.setLevel(logging.ERROR)
-error_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-error_handler.setFormatter(error_formatter)
-
-# Основной обработчик для вывода в консоль
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(console_formatter)
-
-# Настройка логгера
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-logger.addHandler(info_handler)
-logger.addHandler(error_handler)
-logger.addHandler(console_handler)
+# Логи пишет отдельный поток: цикл событий только кладет записи в очередь (app/logs.py)
+log_listener = setup_logging()
 
 # Загрузка переменных окружения из файла .env
 load_dotenv()
@@ -61,71 +35,66 @@ TOKEN = os.getenv('TOKEN')
 if TOKEN is None:
     raise ValueError("TOKEN не найден в переменных окружения")
 
-async def send_reminders(bot: Bot):
-    while True:
-        now = datetime.now()
-        session = SessionLocal()
-        try:
-            reminders = session.query(Reminder).filter(Reminder.reminder_time <= now).all()
-            for reminder in reminders:
-                user_id = reminder.user_id
-                meeting_id = reminder.meeting_id
-                user = session.query(User).filter(User.id == user_id).first()
-                meeting = session.query(Meeting).filter(Meeting.id == meeting_id).first()
+async def main():
+    # Свой адрес Bot API (например, эмулятор нагрузочного теста); по умолчанию api.telegram.org
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=TOKEN, session=session)
+    # Состояния диалогов хранятся в БД и переживают перезапуск
+    storage = PostgresStorage()
+    dp = build_dispatcher(storage)
+    # Время вызовов Bot API для метрик
+    bot.session.middleware(ApiMetricsMiddleware())
+    # Новое состояние FSM записывается раньше, чем пользователь увидит ответ бота
+    bot.session.middleware(FsmFlushMiddleware(storage))
 
-                if user and meeting:
-                    await bot.send_message(user.telegram_id, f"Напоминание:\nСовещание '{meeting.title}' начнется через несколько минут.")
-                    session.delete(reminder)
-                    session.commit()
-        except Exception as e:
-            logger.error(f"Ошибка при отправке напоминаний: {str(e)}")
-        finally:
-            session.close()
-        await asyncio.sleep(60)
+    # Применение новых миграций схемы БД
+    await apply_migrations()
 
-async def check_user_roles(bot: Bot):
-    while True:
-        session = SessionLocal()
-        try:
-            users = session.query(User).filter(User.role_changed == 1).all()  # Фильтруем только тех, у кого role_changed == 1
-            for user in users:
-                telegram_id = user.telegram_id
-                role = user.role
-                if role == 'admin':
-                    await bot.send_message(telegram_id, "Ваша роль обновлена на начальника", reply_markup=kb.admin_keyboard())
-                else:
-                    await bot.send_message(telegram_id, "Ваша роль обновлена на сотрудника", reply_markup=kb.guest_keyboard())
-                
-                # Сбрасываем флаг изменения роли
-                user.role_changed = 0
-                session.commit()
-        except Exception as e:
-            logger.error(f"Ошибка при проверке ролей пользователей: {str(e)}")
-        finally:
-            session.close()
-        await asyncio.sleep(15)
+    # Фоновые задачи работают до остановки бота; ссылки на них хранятся, чтобы при выходе их отменить
+    background = set()
+    # Уведомления о смене роли через LISTEN/NOTIFY: каждое изменение забирает ровно один экземпляр;
+    # изменения пользователей сбрасывают кэш пользователей во всех экземплярах
+    background.add(asyncio.create_task(listen_role_changes(bot)))
+    # Изменения FSM из других экземпляров бота сбрасывают локальный кэш хранилища
+    background.add(asyncio.create_task(storage.listen()))
+    # Планировщик напоминаний, сверка ролей, очистка FSM и удаление прошедших совещаний работают только в ведущем экземпляре
+    background.add(asyncio.create_task(run_as_leader(
+        "background_jobs",
+        lambda: reminder_scheduler.run(bot),
+        lambda: reconcile_role_changes(bot),
+        storage.run_sweeper,
+        run_purge,
+    )))
+    # Очередь исходящих сообщений с ограничением скорости
+    send_queue.start()
 
-async def main():
-    bot = Bot(token=TOKEN)
-    dp = Dispatcher()
+    # Текущие значения пула, очереди отправки и кэшей на странице метрик
+    register_collector("db_pool", get_pool_stats)
+    register_collector("fsm_pool", lambda: get_pool_stats(fsm_engine))
+    register_collector("send_queue", send_queue.stats)
+    register_collector("user_cache", user_cache.stats)
+    register_collector("fsm_storage", storage.stats)
+    register_collector("search_cache", search_cache.stats)
+    register_collector("meeting_views", meeting_views.stats)
+    if METRICS_PORT:
+        try:
+            await run_metrics_server()
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Сервер метрик не запущен: {str(e)}")
 
-    # Подключение маршрутизаторов
-    dp.include_router(user_router)
-    dp.include_router(meeting_router)
-    dp.include_router(reminder_router)
-    dp.include_router(note_router)
-    dp.include_router(participants_router)
-    dp.include_router(invitation_router)
-    dp.include_router(restore_router)
-    dp.include_router(guest_router)
-    dp.include_router(admin_router)
-    dp.include_router(unknow_router)
-    
-    # Запуск фоновой задачи для отправки напоминаний
-    asyncio.create_task(send_reminders(bot))
-    # Запуск фоновой задачи для проверки ролей пользователей
-    asyncio.create_task(check_user_roles(bot))
-    await dp.start_polling(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Снимаем webhook, если бот раньше работал в этом режиме: иначе getUpdates недоступен
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        # Фоновые задачи отменяются и дожидаются: без этого при выходе asyncio сообщает "Task was destroyed but it is pending"
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await send_queue.stop()
 
 if __name__ == '__main__':
     #logging.basicConfig(level=logging.INFO)
@@ -133,4 +102,7 @@ if __name__ == '__main__':
     try:
         asyncio.run(main())
     except Exception as e:
-        logger.error(f'Бот не работает: {str(e)}')
\ No newline at end of file
+        logger.error(f'Бот не работает: {str(e)}')
+    finally:
+        # Дописать записи, оставшиеся в очереди
+        log_listener.stop()
\ No newline at end of file